@@ -0,0 +1,100 @@
+"""適応的な同時実行制御（AdaptiveScheduler）の挙動確認用シミュレーション。
+
+同時アクセス数が ``--capacity`` を超えると HTTP 429 を返す偽エクストラクタに対して
+字幕取得を並列実行し、固定並列数の場合とスループット・429 回数を比較する:
+
+    python benchmarks/bench_adaptive_concurrency.py --videos 300 --capacity 6
+"""
+import argparse
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_subtitle_extractor as yse  # noqa: E402
+
+FAKE_VTT = "WEBVTT\n\n00:00:00.000 --> 00:00:01.000\nスロットリング試験\n"
+
+
+def make_throttling_youtube_dl(capacity, latency):
+    import yt_dlp
+    from yt_dlp.extractor.common import InfoExtractor
+    from yt_dlp.utils import ExtractorError
+
+    state = {"active": 0, "throttled": 0}
+    lock = threading.Lock()
+
+    class ThrottlingYoutubeIE(InfoExtractor):
+        IE_NAME = "throttlingyoutube"
+        _VALID_URL = r"https?://www\.youtube\.com/watch\?v=(?P<id>[^&]+)"
+
+        def _real_extract(self, url):
+            video_id = self._match_id(url)
+            with lock:
+                state["active"] += 1
+                over = state["active"] > capacity
+                if over:
+                    state["throttled"] += 1
+            try:
+                if over:
+                    time.sleep(latency / 4)
+                    raise ExtractorError("HTTP Error 429: Too Many Requests", expected=True)
+                time.sleep(latency)
+            finally:
+                with lock:
+                    state["active"] -= 1
+            return {
+                "id": video_id,
+                "title": video_id,
+                "formats": [],
+                "automatic_captions": {"ja": [{"ext": "vtt", "data": FAKE_VTT}]},
+            }
+
+    def factory():
+        ydl = yt_dlp.YoutubeDL(dict(yse.YDL_PARAMS), auto_init=False)
+        ydl.add_info_extractor(ThrottlingYoutubeIE())
+        return ydl
+
+    return factory, state
+
+
+def run(label, scheduler, workers, video_ids, state):
+    state["throttled"] = 0
+    stats = {}
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda vid: yse.download_and_clean_subtitles(vid, backend="inprocess", stats=stats, scheduler=scheduler),
+            video_ids))
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for r in results if r)
+    final = f"  最終並列数 {scheduler.current_limit:3d}" if scheduler else ""
+    print(f"{label:>12}: {len(video_ids) / elapsed:7.1f} videos/s  成功 {ok}/{len(video_ids)}"
+          f"  429 {state['throttled']:5d} 回{final}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=300)
+    parser.add_argument("--capacity", type=int, default=6, help="429 を返さずに受け付ける同時アクセス数")
+    parser.add_argument("--latency", type=float, default=0.02, help="偽エクストラクタの応答時間（秒）")
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument("--max-rps", type=float, default=None)
+    args = parser.parse_args()
+
+    factory, state = make_throttling_youtube_dl(args.capacity, args.latency)
+    yse.create_youtube_dl = factory
+    video_ids = [f"sim{i:06d}" for i in range(args.videos)]
+
+    # 従来の固定並列（スケジューラなし、429 は即失敗）
+    run("fixed", None, args.max_workers, video_ids, state)
+    scheduler = yse.AdaptiveScheduler(max_workers=args.max_workers, initial_workers=2,
+                                      max_rps=args.max_rps, backoff_base=args.latency)
+    run("adaptive", scheduler, args.max_workers, video_ids, state)
+
+
+if __name__ == "__main__":
+    main()
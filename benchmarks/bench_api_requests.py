@@ -0,0 +1,67 @@
+"""YouTube Data API の一覧取得で送受信する量のベンチマーク。
+
+ローカルの HTTP サーバー（fakes.FakeDataApiServer）を本物の googleapiclient の接続先にし、
+次の3通りで playlistItems を全ページ取得して、リクエスト数・クォータ・受信バイト数・時間を比べる:
+
+- 従来どおり part=snippet の全項目を取得
+- fields で必要な項目に絞って取得（ページキャッシュが空の初回）
+- 同じ一覧の再取得（If-None-Match で再検証し、304 はキャッシュから返す）
+
+    python benchmarks/bench_api_requests.py --videos 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_subtitle_extractor as yse  # noqa: E402
+from fakes import FakeDataApiServer  # noqa: E402
+
+
+def list_without_fields(client, playlist_id):
+    # 変更前の get_video_list と同じリクエスト
+    count, token = 0, None
+    while True:
+        resp = client.playlistItems().list(part="snippet", playlistId=playlist_id, maxResults=50,
+                                           pageToken=token).execute()
+        count += len(resp.get("items", []))
+        token = resp.get("nextPageToken")
+        if not token:
+            return count
+
+
+def measure(server, label, func):
+    before_bytes, before_requests = server.bytes_sent, server.requests
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    requests = server.requests - before_requests
+    print(f"{label:<28} {count:>6} 本  {requests:>4} リクエスト  {requests} ユニット  "
+          f"{(server.bytes_sent - before_bytes) / 1024:9.1f} KiB  {elapsed * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=5000)
+    args = parser.parse_args()
+
+    playlist_id = "UUbenchmark"
+    with FakeDataApiServer(args.videos) as server, tempfile.TemporaryDirectory() as workdir:
+        client = server.client()
+        page_cache = yse.ApiPageCache(path=os.path.join(workdir, "api_cache.sqlite3"))
+
+        def masked():
+            return sum(1 for _ in yse.iter_video_list(playlist_id, None, youtube_client=client,
+                                                      page_cache=page_cache))
+
+        measure(server, "part=snippet（全項目）", lambda: list_without_fields(client, playlist_id))
+        measure(server, "fields 指定・初回", masked)
+        measure(server, "fields 指定・再実行（304）", masked)
+        page_cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""clean_vtt のスループット（MB/s）の計測。
+
+合成した自動生成字幕を各重複除去モードで整形する速度を測る。
+整形結果の正しさはゴールデンファイルと照合するテスト（tests/test_clean_vtt.py）で確かめる:
+
+    python benchmarks/bench_clean_vtt.py --mb 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_subtitle_extractor as yse  # noqa: E402
+from fakes import VOCABULARY  # noqa: E402
+
+
+def synthetic_auto_vtt(target_bytes, seed=0):
+    # YouTube の自動生成字幕と同じく、前の行を繰り返しつつカラオケ用タイミングタグを付ける
+    rng = random.Random(seed)
+    parts = ["WEBVTT\nKind: captions\nLanguage: ja\n\n"]
+    size = len(parts[0].encode("utf-8"))
+    i = 0
+    prev = " "
+    while size < target_bytes:
+        start = f"{i // 1800:02d}:{i // 30 % 60:02d}:{i * 2 % 60:02d}"
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(3, 7))]
+        karaoke = words[0] + "".join(f"<{start}.{j}00><c> {w}</c>" for j, w in enumerate(words[1:]))
+        line = " ".join(words)
+        cue = (f"{start}.000 --> {start}.990 align:start position:0%\n{prev}\n{karaoke}\n\n"
+               f"{start}.990 --> {start}.999 align:start position:0%\n{line}\n \n\n")
+        parts.append(cue)
+        size += len(cue.encode("utf-8"))
+        prev = line
+        i += 1
+    return "".join(parts)
+
+
+def measure(content, repeat):
+    size_mb = len(content.encode("utf-8")) / (1024 * 1024)
+    for mode in yse.VTT_DEDUP_MODES:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = yse.clean_vtt(content, dedup=mode)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        ratio = len(out.encode("utf-8")) / (size_mb * 1024 * 1024)
+        print(f"{mode:>8}: {size_mb / best:7.1f} MB/s  入力 {size_mb:.1f} MB -> 出力 {ratio * 100:.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=float, default=10.0, help="合成する字幕のサイズ（MB）")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    measure(synthetic_auto_vtt(int(args.mb * 1024 * 1024)), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""抽出パイプライン全体（process_and_stream）のオフラインベンチマーク。
+
+YouTube Data API クライアントを合成ページを返す偽物に、yt-dlp を遅延付きで
+自動生成字幕風の VTT を返す偽物に差し替え、動画数ごとに次を計測する:
+
+- videos/sec
+- 動画1本あたりのレイテンシ（p50 / p95）
+- ピーク RSS
+- NDJSON ストリームの最初の1行と最初の完了（overall_progress）までの時間
+
+    python benchmarks/bench_pipeline.py --sizes 100 1000 10000 --output bench_pipeline.json
+
+各サイズは別プロセスで実行するため、ピーク RSS はサイズごとに独立して測られる。
+結果は JSON で保存されるので、変更前後の実行を比較できる。
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_subtitle_extractor as yse  # noqa: E402
+from fakes import FakeYouTubeClient, install_fake_yt_dlp, make_fake_youtube_dl  # noqa: E402
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KiB、macOS はバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_once(videos, args):
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    if args.backend == "subprocess":
+        install_fake_yt_dlp(os.path.join(workdir, "bin"), latency=args.latency)
+    else:
+        yse.create_youtube_dl = make_fake_youtube_dl(latency=args.latency)
+    client = FakeYouTubeClient(videos, page_latency=args.page_latency)
+    yse.get_youtube_client = lambda api_key: client
+
+    latencies = []
+    lock = threading.Lock()
+    original_process_video = yse.process_video
+
+    def timed_process_video(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return original_process_video(*a, **kw)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    original_process_video_async = yse.process_video_async
+
+    async def timed_process_video_async(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return await original_process_video_async(*a, **kw)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    yse.process_video = timed_process_video
+    yse.process_video_async = timed_process_video_async
+    config = {
+        "engine": args.engine,
+        "yt_dlp_backend": args.backend,
+        "cache_enabled": False,
+        "incremental_sync": False,
+        # 利用者の全文検索の索引（~/.subtitle_app_search.sqlite3）に書き込まず、実行ごとの計測条件も揃える
+        "search_index_enabled": False,
+        # 同様に、Data API の一覧ページキャッシュ（~/.subtitle_app_api_cache.sqlite3）も使わない
+        "api_cache_enabled": False,
+        "output_order": args.output_order,
+    }
+    output_dest = os.path.join(workdir, "subtitles.md")
+    url = "https://www.youtube.com/playlist?list=PLbenchmark"
+
+    start = time.perf_counter()
+    first_byte = None
+    first_result = None
+    lines = 0
+    for line in yse.process_and_stream(url, "offline", output_dest, config=config):
+        now = time.perf_counter()
+        if first_byte is None:
+            first_byte = now - start
+        if first_result is None and '"overall_progress"' in line:
+            first_result = now - start
+        lines += 1
+    elapsed = time.perf_counter() - start
+    output_bytes = os.path.getsize(output_dest)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "videos": videos,
+        "elapsed_sec": elapsed,
+        "videos_per_sec": videos / elapsed if elapsed else None,
+        "latency_p50_sec": percentile(latencies, 0.50),
+        "latency_p95_sec": percentile(latencies, 0.95),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "ttfb_sec": first_byte,
+        "time_to_first_result_sec": first_result,
+        "ndjson_lines": lines,
+        "output_bytes": output_bytes,
+        "pages_served": client.pages_served,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="計測する動画数")
+    parser.add_argument("--engine", choices=yse.ENGINES, default="threads")
+    parser.add_argument("--backend", choices=yse.YT_DLP_BACKENDS, default="inprocess")
+    parser.add_argument("--latency", type=float, default=0.05, help="偽 yt-dlp の応答遅延（秒）")
+    parser.add_argument("--page-latency", type=float, default=0.1, help="偽 Data API の1ページあたりの遅延（秒）")
+    parser.add_argument("--output-order", choices=yse.OUTPUT_ORDERS, default="playlist")
+    parser.add_argument("--output", default=None, help="結果を保存する JSON ファイル")
+    parser.add_argument("--single", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        json.dump(run_once(args.single, args), sys.stdout)
+        return
+
+    results = []
+    for size in args.sizes:
+        argv = [sys.executable, os.path.abspath(__file__), "--single", str(size),
+                "--engine", args.engine, "--backend", args.backend, "--latency", str(args.latency),
+                "--page-latency", str(args.page_latency), "--output-order", args.output_order]
+        proc = subprocess.run(argv, stdout=subprocess.PIPE, check=True, text=True)
+        result = json.loads(proc.stdout)
+        results.append(result)
+        print(f"{size:>6} 本: {result['videos_per_sec']:8.1f} videos/s"
+              f"  p50 {result['latency_p50_sec'] * 1000:7.1f} ms  p95 {result['latency_p95_sec'] * 1000:7.1f} ms"
+              f"  RSS {result['peak_rss_bytes'] / 1024 / 1024:7.1f} MiB"
+              f"  TTFB {result['ttfb_sec'] * 1000:6.1f} ms  初回完了 {result['time_to_first_result_sec'] * 1000:7.1f} ms")
+
+    if args.output:
+        report = {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "single")},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
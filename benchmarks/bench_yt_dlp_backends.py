@@ -0,0 +1,67 @@
+"""yt-dlp 実行方式（subprocess / inprocess）ごとの動画1本あたりのレイテンシ比較。
+
+ネットワークには出ず、ローカルの偽エクストラクタで字幕を返す:
+
+    python benchmarks/bench_yt_dlp_backends.py --videos 50 --latency 0.0
+
+subprocess 方式は PATH 先頭に置いた偽の ``yt-dlp`` 実行ファイルを起動し、
+``-J`` によるメタデータ取得に応答させる。
+偽実行ファイルは実物と同じく ``yt_dlp`` を import するため、起動コストは実測に近い。
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_subtitle_extractor as yse  # noqa: E402
+from fakes import SHORT_VTT, install_fake_yt_dlp, make_fake_youtube_dl  # noqa: E402
+
+
+def measure(backend, video_ids):
+    latencies = []
+    for video_id in video_ids:
+        start = time.perf_counter()
+        text = yse.download_and_clean_subtitles(video_id, lang="ja", backend=backend)
+        latencies.append(time.perf_counter() - start)
+        if not text:
+            raise RuntimeError(f"{backend}: 字幕が取得できませんでした ({video_id})")
+    return latencies
+
+
+def report(backend, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{backend:>10}: mean {statistics.mean(latencies) * 1000:8.1f} ms"
+          f"  p50 {statistics.median(latencies) * 1000:8.1f} ms"
+          f"  p95 {p95 * 1000:8.1f} ms  (n={len(latencies)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=20, help="計測する動画数")
+    parser.add_argument("--latency", type=float, default=0.0, help="偽エクストラクタの応答遅延（秒）")
+    parser.add_argument("--manual", action="store_true", help="手動字幕のある動画として振る舞う（既定は自動字幕のみ）")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_yt_dlp_")
+    install_fake_yt_dlp(os.path.join(workdir, "bin"), latency=args.latency, manual=args.manual, vtt=SHORT_VTT)
+    yse.create_youtube_dl = make_fake_youtube_dl(args.latency, args.manual, vtt=SHORT_VTT)
+
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        video_ids = [f"bench{i:06d}" for i in range(args.videos)]
+        for backend in yse.YT_DLP_BACKENDS:
+            report(backend, measure(backend, video_ids))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""ベンチマーク用のオフラインの偽物（YouTube Data API クライアント・yt-dlp）。
+
+どれもネットワークに出ずに、本物と同じ形のレスポンスを返す。
+"""
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_subtitle_extractor as yse  # noqa: E402
+
+SHORT_VTT = """WEBVTT
+Kind: captions
+Language: ja
+
+00:00:00.000 --> 00:00:02.000
+これはベンチマーク用の字幕です
+
+00:00:02.000 --> 00:00:04.000
+二行目の字幕です
+"""
+
+VOCABULARY = ("今日は", "天気", "いい", "ですね", "散歩", "公園", "行き", "ましょう", "それでは", "次の",
+              "話題", "について", "説明", "します", "こちら", "ご覧", "ください", "動画", "字幕", "確認")
+
+
+def auto_caption_vtt(seed, cues=60):
+    # YouTube の自動生成字幕と同じく、前の行を繰り返しつつカラオケ用タイミングタグを付ける
+    rng = random.Random(seed)
+    parts = ["WEBVTT\nKind: captions\nLanguage: ja\n\n"]
+    prev = " "
+    for i in range(cues):
+        start = f"{i // 1800:02d}:{i // 30 % 60:02d}:{i * 2 % 60:02d}"
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(3, 7))]
+        karaoke = words[0] + "".join(f"<{start}.{j}00><c> {w}</c>" for j, w in enumerate(words[1:]))
+        line = " ".join(words)
+        parts.append(f"{start}.000 --> {start}.990 align:start position:0%\n{prev}\n{karaoke}\n\n"
+                     f"{start}.990 --> {start}.999 align:start position:0%\n{line}\n \n\n")
+        prev = line
+    return "".join(parts)
+
+
+class _Request:
+    def __init__(self, func):
+        self._func = func
+
+    def execute(self):
+        return self._func()
+
+
+class _PlaylistItems:
+    def __init__(self, client):
+        self._client = client
+
+    def list(self, part, playlistId, maxResults=50, pageToken=None, **kwargs):
+        return _Request(lambda: self._client.playlist_page(int(pageToken or 0), maxResults))
+
+
+class _Channels:
+    def list(self, part, id=None, **kwargs):
+        return _Request(lambda: {"items": [{"id": id, "contentDetails": {"relatedPlaylists": {"uploads": "UU" + id}}}]})
+
+
+def fake_published_at(index):
+    # アップロード再生リストと同じく、一覧の先頭ほど新しい（12時間おき）
+    published = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc) - datetime.timedelta(hours=12 * index)
+    return published.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def fake_video_details(video_id):
+    # 動画 ID から決まる再生時間・手動字幕の有無を持つ videos.list の要素
+    n = int(hashlib.sha1(video_id.encode()).hexdigest()[:8], 16)
+    seconds = 30 + n % 3600
+    return {
+        "id": video_id,
+        "snippet": {"publishedAt": fake_published_at(int(re.sub(r"\D", "", video_id) or 0)),
+                    "liveBroadcastContent": "none"},
+        "contentDetails": {"duration": f"PT{seconds // 3600}H{seconds // 60 % 60}M{seconds % 60}S",
+                           "caption": "true" if n % 3 == 0 else "false"},
+    }
+
+
+class _Videos:
+    def list(self, part, id, **kwargs):
+        return _Request(lambda: {"items": [fake_video_details(v) for v in id.split(",")]})
+
+
+class FakeYouTubeClient:
+    """googleapiclient の youtube v3 クライアントのうち、本アプリが使う部分だけを真似る。"""
+
+    def __init__(self, total, page_latency=0.0):
+        self.total = total
+        self.page_latency = page_latency
+        self.pages_served = 0
+
+    def playlistItems(self):
+        return _PlaylistItems(self)
+
+    def channels(self):
+        return _Channels()
+
+    def videos(self):
+        return _Videos()
+
+    def playlist_page(self, start, size):
+        time.sleep(self.page_latency)
+        self.pages_served += 1
+        items = [{"snippet": {"title": f"動画 {i}", "resourceId": {"videoId": f"fake{i:07d}"}},
+                  "contentDetails": {"videoId": f"fake{i:07d}", "videoPublishedAt": fake_published_at(i)}}
+                 for i in range(start, min(self.total, start + size))]
+        resp = {"items": items, "pageInfo": {"totalResults": self.total, "resultsPerPage": size}}
+        if start + size < self.total:
+            resp["nextPageToken"] = str(start + size)
+        return resp
+
+
+def make_fake_youtube_dl(latency=0.0, manual=False, vtt=None, langs=("ja",)):
+    """yse.create_youtube_dl の差し替え用。偽エクストラクタだけを登録した YoutubeDL を返す。"""
+    import yt_dlp
+    from yt_dlp.extractor.common import InfoExtractor
+
+    class FakeYoutubeIE(InfoExtractor):
+        IE_NAME = "fakeyoutube"
+        _VALID_URL = r"https?://www\.youtube\.com/watch\?v=(?P<id>[^&]+)"
+
+        def _real_extract(self, url):
+            video_id = self._match_id(url)
+            time.sleep(latency)
+            tracks = {lang: [{"ext": "vtt", "data": vtt if vtt is not None else auto_caption_vtt(video_id)}]
+                      for lang in langs}
+            return {
+                "id": video_id,
+                "title": video_id,
+                "formats": [],
+                "subtitles": tracks if manual else {},
+                "automatic_captions": {} if manual else tracks,
+            }
+
+    def factory():
+        ydl = yt_dlp.YoutubeDL(dict(yse.YDL_PARAMS), auto_init=False)
+        ydl.add_info_extractor(FakeYoutubeIE())
+        return ydl
+
+    return factory
+
+
+FAKE_YT_DLP = """#!{python}
+import json
+import sys
+import time
+import yt_dlp  # noqa: F401  実物と同じ import コストを再現する
+
+sys.path.insert(0, {bench_dir!r})
+from fakes import auto_caption_vtt
+
+args = sys.argv[1:]
+if "-J" in args:
+    video_id = args[-1].rsplit("=", 1)[-1]
+    vtt = {vtt!r}
+    tracks = {{"ja": [{{"ext": "vtt", "data": vtt if vtt is not None else auto_caption_vtt(video_id)}}]}}
+    time.sleep({latency!r})
+    json.dump({{
+        "id": video_id,
+        "subtitles": tracks if {manual!r} else {{}},
+        "automatic_captions": {{}} if {manual!r} else tracks,
+    }}, sys.stdout)
+"""
+
+
+def install_fake_yt_dlp(bin_dir, latency=0.0, manual=False, vtt=None):
+    """bin_dir に偽の yt-dlp 実行ファイルを置き、PATH の先頭に追加する。"""
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, "yt-dlp")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(FAKE_YT_DLP.format(python=sys.executable, bench_dir=os.path.dirname(os.path.abspath(__file__)),
+                                   vtt=vtt, latency=latency, manual=manual))
+    os.chmod(path, 0o755)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    return path
+
+
+def _parse_fields(spec):
+    # Data API の fields 構文（"a,b/c,d(e,f/g)"）を {名前: 子の木 or None} に変換する
+    tree, pos = {}, 0
+    while pos < len(spec):
+        end = pos
+        while end < len(spec) and spec[end] not in ",/()":
+            end += 1
+        name, pos = spec[pos:end], end
+        if pos < len(spec) and spec[pos] == "/":
+            child, used = _parse_fields_path(spec[pos + 1:])
+            tree.setdefault(name, {}).update(child)
+            pos += 1 + used
+        elif pos < len(spec) and spec[pos] == "(":
+            depth, end = 1, pos + 1
+            while depth:
+                depth += {"(": 1, ")": -1}.get(spec[end], 0)
+                end += 1
+            tree.setdefault(name, {}).update(_parse_fields(spec[pos + 1:end - 1]))
+            pos = end
+        else:
+            tree[name] = None
+        if pos < len(spec) and spec[pos] == ",":
+            pos += 1
+    return tree
+
+
+def _parse_fields_path(spec):
+    # "b/c" や "d(e,f)" のように1要素分だけ読み、木と消費した文字数を返す
+    depth = 0
+    for i, ch in enumerate(spec):
+        depth += {"(": 1, ")": -1}.get(ch, 0)
+        if ch == "," and depth == 0:
+            return _parse_fields(spec[:i]), i
+    return _parse_fields(spec), len(spec)
+
+
+def _apply_fields(value, tree):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_apply_fields(v, tree) for v in value]
+    if not isinstance(value, dict):
+        return value
+    return {k: _apply_fields(value[k], sub) for k, sub in tree.items() if k in value}
+
+
+class FakeDataApiServer:
+    """YouTube Data API v3 の playlistItems / videos / channels を真似るローカル HTTP サーバー。
+
+    本物の googleapiclient を api_endpoint でこちらに向けて使う。fields によるレスポンスの
+    絞り込みと、ETag / If-None-Match による 304 応答に対応し、送信したバイト数を数える。
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.bytes_sent = 0
+        self.requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def client(self):
+        from googleapiclient.discovery import build
+        return build("youtube", "v3", developerKey="offline", static_discovery=True,
+                     client_options={"api_endpoint": self.endpoint})
+
+    def playlist_items(self, query):
+        start = int(query.get("pageToken", "0") or 0)
+        size = int(query.get("maxResults", "5"))
+        playlist_id = query.get("playlistId", "")
+        items = []
+        for i in range(start, min(self.total, start + size)):
+            video_id = f"fake{i:07d}"
+            thumbnails = {name: {"url": f"https://i.ytimg.com/vi/{video_id}/{name}.jpg", "width": w, "height": h}
+                          for name, w, h in (("default", 120, 90), ("medium", 320, 180), ("high", 480, 360),
+                                             ("standard", 640, 480), ("maxres", 1280, 720))}
+            items.append({
+                "kind": "youtube#playlistItem",
+                "etag": hashlib.sha1(video_id.encode()).hexdigest(),
+                "id": hashlib.sha1(f"{playlist_id}:{video_id}".encode()).hexdigest(),
+                "contentDetails": {"videoId": video_id, "videoPublishedAt": fake_published_at(i)},
+                "snippet": {
+                    "publishedAt": fake_published_at(i),
+                    "channelId": "UCfake",
+                    "title": f"動画 {i}",
+                    "description": "動画の説明文です。" * 20,
+                    "thumbnails": thumbnails,
+                    "channelTitle": "ベンチマーク用チャンネル",
+                    "playlistId": playlist_id,
+                    "position": i,
+                    "resourceId": {"kind": "youtube#video", "videoId": video_id},
+                    "videoOwnerChannelTitle": "ベンチマーク用チャンネル",
+                    "videoOwnerChannelId": "UCfake",
+                },
+            })
+        resp = {"kind": "youtube#playlistItemListResponse", "items": items,
+                "pageInfo": {"totalResults": self.total, "resultsPerPage": size}}
+        if start + size < self.total:
+            resp["nextPageToken"] = str(start + size)
+        return resp
+
+    def _handle(self, handler):
+        parsed = urllib.parse.urlparse(handler.path)
+        query = {k: v[0] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+        resource = parsed.path.rstrip("/").rsplit("/", 1)[-1]
+        if resource == "playlistItems":
+            resp = self.playlist_items(query)
+        elif resource == "videos":
+            resp = {"kind": "youtube#videoListResponse",
+                    "items": [fake_video_details(v) for v in query.get("id", "").split(",") if v]}
+        elif resource == "channels":
+            name = query.get("forHandle") or query.get("forUsername")
+            channel_id = query.get("id") or "UC" + hashlib.sha1(name.lower().encode()).hexdigest()[:22]
+            resp = {"kind": "youtube#channelListResponse",
+                    "items": [{"id": channel_id, "contentDetails": {"relatedPlaylists": {"uploads": "UU" + channel_id}}}]}
+        else:
+            handler.send_error(404)
+            return
+        # 本物と同じく、ETag は絞り込み前の内容から決まる
+        etag = hashlib.sha1(json.dumps(resp, sort_keys=True).encode()).hexdigest()
+        resp["etag"] = etag
+        if "fields" in query:
+            resp = _apply_fields(resp, _parse_fields(query["fields"]))
+        with self._lock:
+            self.requests += 1
+        if handler.headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.not_modified += 1
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.end_headers()
+            return
+        body = json.dumps(resp, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self.bytes_sent += len(body)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json; charset=UTF-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("ETag", etag)
+        handler.end_headers()
+        handler.wfile.write(body)
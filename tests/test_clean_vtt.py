@@ -0,0 +1,80 @@
+"""clean_vtt のゴールデンファイル照合。
+
+``tests/data/clean_vtt/<名前>.vtt`` を各重複除去モードで整形した結果が ``<名前>.<モード>.txt`` と
+一致することを確かめる。名前が ``manual_`` / ``youtube_auto_`` で始まるファイルは、それぞれ手動字幕・
+自動生成字幕のトラックとして finish_subtitles に通し、トラックの種類に応じたモード（手動字幕は常に exact）の
+期待値と一致することも確かめる。期待値を作り直す場合:
+
+    python tests/test_clean_vtt.py --update-golden
+"""
+import glob
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_subtitle_extractor as yse  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "clean_vtt")
+VTT_PATHS = sorted(glob.glob(os.path.join(DATA_DIR, "*.vtt")))
+TRACK_KIND_PREFIXES = {"manual_": "manual", "youtube_auto_": "auto"}
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def golden_path(vtt_path, mode):
+    return vtt_path[:-len(".vtt")] + f".{mode}.txt"
+
+
+def track_kind(vtt_path):
+    name = os.path.basename(vtt_path)
+    return next((kind for prefix, kind in TRACK_KIND_PREFIXES.items() if name.startswith(prefix)), None)
+
+
+@pytest.mark.parametrize("mode", yse.VTT_DEDUP_MODES)
+@pytest.mark.parametrize("vtt_path", VTT_PATHS, ids=os.path.basename)
+def test_clean_vtt_matches_golden(vtt_path, mode):
+    assert yse.clean_vtt(read(vtt_path), dedup=mode) + "\n" == read(golden_path(vtt_path, mode))
+
+
+@pytest.mark.parametrize("vtt_path", [p for p in VTT_PATHS if track_kind(p)], ids=os.path.basename)
+def test_finish_subtitles_uses_mode_for_track_kind(vtt_path):
+    # 実際の処理と同じ経路で、トラックの種類ごとのモードが選ばれていること
+    kind = track_kind(vtt_path)
+    actual = yse.finish_subtitles("golden", "ja", read(vtt_path), kind, [kind]) + "\n"
+    assert actual == read(golden_path(vtt_path, yse.dedup_mode_for(kind)))
+
+
+def test_manual_track_keeps_every_line():
+    # 手動字幕では、前の行の末尾と同じ言葉で始まる台詞も削らない
+    text = yse.finish_subtitles("golden", "ja", read(os.path.join(DATA_DIR, "manual_dialogue.vtt")), "manual",
+                                ["manual"])
+    assert "はい" in text.split("\n")
+    assert "is right, okay then we go home" in text.split("\n")
+
+
+def test_modes_differ_on_rolling_auto_captions():
+    # rolling でしか取り除けない重なりを含む自動生成字幕がゴールデンに含まれていること
+    path = os.path.join(DATA_DIR, "youtube_auto_rollup_overlap.vtt")
+    assert read(golden_path(path, "exact")) != read(golden_path(path, "rolling"))
+
+
+def update_golden():
+    for vtt_path in VTT_PATHS:
+        content = read(vtt_path)
+        for mode in yse.VTT_DEDUP_MODES:
+            with open(golden_path(vtt_path, mode), "w", encoding="utf-8") as f:
+                f.write(yse.clean_vtt(content, dedup=mode) + "\n")
+            print(os.path.basename(golden_path(vtt_path, mode)))
+
+
+if __name__ == "__main__":
+    if "--update-golden" in sys.argv:
+        update_golden()
+    else:
+        sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,102 @@
+"""抽出パイプライン（process_and_stream）の出力順・重複・再開の検証。
+
+benchmarks/fakes.py の偽の Data API クライアントと偽の yt-dlp を使い、ネットワークに出ずに実行する。
+"""
+import json
+import re
+
+import pytest
+
+import youtube_subtitle_extractor as yse
+from fakes import FakeYouTubeClient, make_fake_youtube_dl
+
+pytest.importorskip("yt_dlp")
+
+URL = "https://www.youtube.com/playlist?list=PLtest"
+VIDEOS = 120
+SECTION_REGEX = re.compile(r"^## \[.*\]\(https://www\.youtube\.com/watch\?v=([\w-]+)\)$", re.M)
+EXPECTED_IDS = [f"fake{i:07d}" for i in range(VIDEOS)]
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    client = FakeYouTubeClient(VIDEOS)
+    monkeypatch.setattr(yse, "get_youtube_client", lambda api_key: client)
+    monkeypatch.setattr(yse, "create_youtube_dl", make_fake_youtube_dl(latency=0.002))
+    return client
+
+
+def make_config(engine, output_order):
+    # 利用者のキャッシュや索引に触れないよう、永続化する機能はすべて無効にする
+    return {
+        "engine": engine,
+        "yt_dlp_backend": "inprocess",
+        "output_order": output_order,
+        "cache_enabled": False,
+        "incremental_sync": False,
+        "search_index_enabled": False,
+        "api_cache_enabled": False,
+        "channel_cache_enabled": False,
+    }
+
+
+def run(output_dest, config, resume=None, stop_after=None):
+    # stop_after 本の完了を受け取った時点でストリームを閉じ、クライアントの切断を再現する
+    events = []
+    stream = yse.process_and_stream(URL, "offline", output_dest, config=config, resume=resume)
+    for line in stream:
+        event = json.loads(line)
+        events.append(event)
+        if stop_after is not None and event["type"] == "overall_progress" and event["done"] >= stop_after:
+            stream.close()
+            break
+    return events
+
+
+def section_ids(output_dest):
+    with open(output_dest, encoding="utf-8") as f:
+        return SECTION_REGEX.findall(f.read())
+
+
+def assert_complete(output_dest, output_order):
+    ids = section_ids(output_dest)
+    assert len(ids) == len(set(ids)), "同じ動画のセクションが重複しています"
+    if output_order == "playlist":
+        assert ids == EXPECTED_IDS
+    else:
+        assert sorted(ids) == EXPECTED_IDS
+    manifest = yse.load_manifest(output_dest)
+    assert manifest["status"] == "completed"
+    assert [v["video_id"] for v in manifest["videos"]] == EXPECTED_IDS
+    assert all(v["status"] == "done" for v in manifest["videos"])
+
+
+@pytest.mark.parametrize("output_order", yse.OUTPUT_ORDERS)
+@pytest.mark.parametrize("engine", yse.ENGINES)
+def test_full_run_writes_every_video_once_in_order(offline, tmp_path, engine, output_order):
+    output_dest = str(tmp_path / "subtitles.md")
+    events = run(output_dest, make_config(engine, output_order))
+    assert events[-1]["type"] == "confirm"
+    assert_complete(output_dest, output_order)
+
+
+@pytest.mark.parametrize("output_order", yse.OUTPUT_ORDERS)
+@pytest.mark.parametrize("engine", yse.ENGINES)
+def test_resume_after_disconnect_does_not_duplicate_or_skip(offline, tmp_path, engine, output_order):
+    output_dest = str(tmp_path / "subtitles.md")
+    config = make_config(engine, output_order)
+    run(output_dest, config, stop_after=30)
+    manifest = yse.find_resumable_manifest(output_dest, url=URL)
+    assert manifest is not None and manifest["status"] != "completed"
+    done_before = {v["video_id"] for v in manifest["videos"] if v["status"] == "done"}
+    # 中断時点で done のものはすべて出力済みで、出力済みのものは done になっていること
+    assert set(section_ids(output_dest)) == done_before
+
+    events = run(output_dest, config, resume=manifest)
+    assert events[-1]["type"] == "confirm"
+    assert_complete(output_dest, output_order)
+    # 再開後は完了済みの動画を処理し直さない（ログの「開始: 動画 N」で確かめる）
+    started = {f"fake{int(e['message'].rsplit(' ', 1)[1]):07d}" for e in events
+               if e["type"] == "log" and e["message"].startswith("開始: ")}
+    assert started and not started & done_before
+    assert started | done_before == set(EXPECTED_IDS)
@@ -1,23 +1,37 @@
 import os
 import sys
 import re
+import io
 import json
+import html
+import mmap
+import zlib
+import signal
+import shutil
+import argparse
+import tempfile
+import asyncio
+import hashlib
+import heapq
+import sqlite3
 import subprocess
 import urllib.parse
+import urllib.request
 import concurrent.futures
-from queue import Queue, Empty
-from flask import Flask, request, Response, send_file, render_template_string, jsonify
-import googleapiclient.discovery
-import keyring
+from collections import OrderedDict, deque
+from queue import Queue, Empty, Full
 import threading
 import socket
 import webbrowser
 import time
+import uuid
+import random
+import datetime
 
 # --- 正規表現のコンパイル ---
-PROGRESS_REGEX = re.compile(r'(\d{1,3}\.\d)%')
 TAG_REGEX = re.compile(r"<[^>]+>")
 TIME_REGEX = re.compile(r"\d{2}:\d{2}:\d{2}\.\d+")
+CUE_TIMING_REGEX = re.compile(r"((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})")
 
 # 設定ファイルパス（ユーザのホームディレクトリ直下に .subtitle_app_config.json）
 CONFIG_PATH = os.path.join(os.path.expanduser("~"), ".subtitle_app_config.json")
@@ -32,6 +46,44 @@ def save_config_to_file(config):
     with open(CONFIG_PATH, "w", encoding="utf-8") as f:
         json.dump(config, f)
 
+# チャンネルごとの差分同期状態（アップロード再生リストID -> 最新の処理済み動画ID）
+SYNC_STATE_PATH = os.path.join(os.path.expanduser("~"), ".subtitle_app_sync.json")
+SYNC_KNOWN_IDS = 50
+
+def load_sync_state():
+    if os.path.exists(SYNC_STATE_PATH):
+        with open(SYNC_STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_sync_state(state):
+    with open(SYNC_STATE_PATH, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+def get_sync_entry(playlist_id, output_dest):
+    # 出力ファイルが前回の同期直後のままの場合に限り差分同期する
+    entry = load_sync_state().get(playlist_id)
+    if not entry or entry.get("output") != output_dest:
+        return None
+    try:
+        size = os.path.getsize(output_dest)
+    except OSError:
+        return None
+    if size != entry.get("output_size"):
+        return None
+    return entry
+
+def update_sync_entry(playlist_id, output_dest, new_ids, previous=None):
+    state = load_sync_state()
+    known = list(new_ids) + list((previous or {}).get("known_ids", []))
+    state[playlist_id] = {
+        "known_ids": known[:SYNC_KNOWN_IDS],
+        "output": output_dest,
+        "output_size": os.path.getsize(output_dest),
+        "synced_at": time.time()
+    }
+    save_sync_state(state)
+
 # 出力先フォルダ選択（macOSはAppleScript、WindowsはTkinterを使用）
 def choose_output_folder():
     folder = ""
@@ -58,7 +110,48 @@ def choose_output_folder():
 # 履歴（簡易なグローバル変数；プロセス終了時にリセットされます）
 HISTORY = []
 
-app = Flask(__name__)
+# Flask・googleapiclient・keyring は読み込みに時間がかかるため、使う時点で import する。
+# コマンドラインのバッチ実行（main）はサーバーを起動しないので、Flask を読み込まずに始められる。
+class LazyFlaskApp:
+    # @app.route で登録したルートを記録しておき、app.run や app.test_client などに初めて触れた時点で
+    # Flask アプリを作る。アプリを作った後の @app.route はそのまま Flask アプリに登録する。
+    # ルート内で使う request・Response などは各ルートの中で flask から import する
+    def __init__(self, import_name):
+        self.import_name = import_name
+        self._routes = []
+        self._app = None
+
+    def route(self, rule, **options):
+        def decorator(func):
+            if self._app is not None:
+                self._app.add_url_rule(rule, view_func=func, **options)
+            else:
+                self._routes.append((rule, options, func))
+            return func
+        return decorator
+
+    def load(self):
+        if self._app is None:
+            import flask
+            app = flask.Flask(self.import_name)
+            for rule, options, func in self._routes:
+                app.add_url_rule(rule, view_func=func, **options)
+            self._routes = []
+            self._app = app
+        return self._app
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+def get_api_key():
+    import keyring
+    return keyring.get_password("subtitle_app", "api_key")
+
+def set_api_key(api_key):
+    import keyring
+    keyring.set_password("subtitle_app", "api_key", api_key)
+
+app = LazyFlaskApp(__name__)
 
 # HTMLテンプレート
 HTML_TEMPLATE = """
@@ -240,10 +333,44 @@ HTML_TEMPLATE = """
               実行
             </button>
           </div>
+          <div class="row g-2 mt-2 align-items-center">
+            <div class="col-auto">
+              <label for="since" class="form-label mb-0">公開日（開始）</label>
+              <input type="date" class="form-control" id="since" name="since">
+            </div>
+            <div class="col-auto">
+              <label for="until" class="form-label mb-0">公開日（終了）</label>
+              <input type="date" class="form-control" id="until" name="until">
+            </div>
+            <div class="col-auto">
+              <label for="limit" class="form-label mb-0">最大本数</label>
+              <input type="number" class="form-control" id="limit" name="limit" min="1" placeholder="すべて">
+            </div>
+            <div class="col-auto">
+              <label for="languages" class="form-label mb-0">言語（優先順）</label>
+              <input type="text" class="form-control" id="languages" name="languages" placeholder="ja, en">
+            </div>
+            <div class="col-auto">
+              <label for="language_mode" class="form-label mb-0">複数言語の扱い</label>
+              <select class="form-select" id="language_mode" name="language_mode">
+                <option value="all">すべて出力</option>
+                <option value="first">最初に見つかった言語のみ</option>
+              </select>
+            </div>
+            <div class="col-auto form-check ms-2">
+              <input class="form-check-input" type="checkbox" id="exclude_shorts" name="exclude_shorts">
+              <label class="form-check-label" for="exclude_shorts">ショートを除く</label>
+            </div>
+            <div class="col-auto form-check ms-2">
+              <input class="form-check-input" type="checkbox" id="exclude_live" name="exclude_live">
+              <label class="form-check-label" for="exclude_live">ライブ配信を除く</label>
+            </div>
+          </div>
           <div class="progress-container">
             <div class="progress">
               <div id="overallProgress" class="progress-bar" role="progressbar" style="width: 0%"></div>
             </div>
+            <div id="activeVideos" class="small mt-2"></div>
           </div>
         </form>
       </div>
@@ -276,6 +403,13 @@ HTML_TEMPLATE = """
               <label for="port" class="form-label">ポート番号</label>
               <input type="text" class="form-control" id="port" name="port" placeholder="5000">
             </div>
+            <div class="mb-3">
+              <label for="yt_dlp_backend" class="form-label">yt-dlp 実行方式</label>
+              <select class="form-select" id="yt_dlp_backend" name="yt_dlp_backend">
+                <option value="subprocess">サブプロセス（既定）</option>
+                <option value="inprocess">インプロセス（高速）</option>
+              </select>
+            </div>
             <div class="form-check">
               <input class="form-check-input" type="checkbox" id="auto_open_browser" name="auto_open_browser">
               <label class="form-check-label" for="auto_open_browser">
@@ -302,9 +436,19 @@ HTML_TEMPLATE = """
       });
 
       // 設定モーダル表示
+      // 保存済みの設定を入力欄に反映してから開く（未反映のまま保存すると既定値で上書きされるため）
       document.getElementById('settingsBtn').addEventListener('click', function() {
         var settingsModal = new bootstrap.Modal(document.getElementById('settingsModal'));
-        settingsModal.show();
+        fetch('/get_config')
+          .then(response => response.json())
+          .then(data => {
+            document.getElementById('api_key').placeholder = data.api_key_set ? '設定済み（変更する場合のみ入力）' : 'Your API Key';
+            document.getElementById('output_dest').value = data.output_dest;
+            document.getElementById('port').value = data.port;
+            document.getElementById('yt_dlp_backend').value = data.yt_dlp_backend;
+            document.getElementById('auto_open_browser').checked = data.auto_open_browser;
+          })
+          .finally(() => settingsModal.show());
       });
 
       // 出力フォルダ選択ボタンの処理
@@ -336,6 +480,78 @@ HTML_TEMPLATE = """
         container.prepend(item);
       }
 
+      // ジョブの進捗イベント（SSE）を受け取り、処理中の動画と処理速度を表示する
+      let jobEvents = null;
+      function watchJobEvents(jobId) {
+        if (jobEvents) jobEvents.close();
+        const active = new Map();
+        const panel = document.getElementById('activeVideos');
+        const stageLabels = {
+          started: '開始', waiting: '待機中', probing: '情報取得中', downloading: 'ダウンロード中',
+          cleaning: '整形中', cached: 'キャッシュ', shared: '他のジョブの結果を共有', throttled: '再試行待ち',
+          timeout: 'タイムアウト（再試行）'
+        };
+        let rateText = '';
+        function render() {
+          panel.innerHTML = '';
+          const lines = rateText ? [rateText] : [];
+          Array.from(active.values()).slice(0, 8).forEach(v => {
+            lines.push(`${stageLabels[v.stage] || v.stage} ${Math.round(v.progress)}% — ${v.title || v.video_id}`);
+          });
+          lines.forEach(text => {
+            const div = document.createElement('div');
+            div.textContent = text;
+            panel.appendChild(div);
+          });
+        }
+        jobEvents = new EventSource('/events/' + jobId);
+        jobEvents.addEventListener('video', e => {
+          const v = JSON.parse(e.data);
+          if (v.stage === 'done' || v.stage === 'skipped') {
+            active.delete(v.video_id);
+          } else {
+            active.set(v.video_id, Object.assign(active.get(v.video_id) || {}, v));
+          }
+          render();
+        });
+        jobEvents.addEventListener('snapshot', e => {
+          active.clear();
+          JSON.parse(e.data).videos.forEach(v => active.set(v.video_id, v));
+          render();
+        });
+        jobEvents.addEventListener('progress', e => {
+          const p = JSON.parse(e.data);
+          rateText = `処理速度: ${p.videos_per_second} 本/秒` + (p.eta_seconds != null ? ` / 残り約 ${p.eta_seconds} 秒` : '');
+          render();
+        });
+        jobEvents.addEventListener('status', e => {
+          if (JSON.parse(e.data).status !== 'running') {
+            document.getElementById('cancelJobBtn')?.remove();
+            jobEvents.close();
+            active.clear();
+            rateText = '';
+            render();
+          }
+        });
+      }
+
+      // 実行中のジョブの中止ボタン
+      function showCancelButton(jobId) {
+        document.getElementById('cancelJobBtn')?.remove();
+        const btn = document.createElement('button');
+        btn.id = 'cancelJobBtn';
+        btn.type = 'button';
+        btn.className = 'btn btn-outline-danger btn-sm mt-2';
+        btn.innerHTML = '<i class="mdi mdi-stop"></i> 中止';
+        btn.onclick = () => {
+          btn.disabled = true;
+          fetch('/jobs/' + jobId + '/cancel', { method: 'POST' })
+            .then(response => response.json())
+            .then(data => addStatus(data.message, 'info'));
+        };
+        document.getElementById('activeVideos').after(btn);
+      }
+
       // メインフォーム送信処理
       document.getElementById('mainForm').addEventListener('submit', function(e) {
         e.preventDefault();
@@ -349,16 +565,23 @@ HTML_TEMPLATE = """
         fetch('/process', { method: 'POST', body: formData }).then(response => {
           const reader = response.body.getReader();
           const decoder = new TextDecoder();
+          // 1行が複数のチャンクに分かれて届くことがあるため、改行までを溜めてから解釈する
+          let buffer = '';
           
           function read() {
             reader.read().then(({done, value}) => {
-              if (done) return;
-              const text = decoder.decode(value);
-              text.split("\\n").forEach(line => {
+              buffer += done ? decoder.decode() : decoder.decode(value, { stream: true });
+              const lines = buffer.split("\\n");
+              buffer = done ? '' : lines.pop();
+              lines.forEach(line => {
+                if (!line.trim()) return;
                 try {
                   const msg = JSON.parse(line);
                   if(msg.type === "log") {
                     addStatus(msg.message, 'info');
+                  } else if(msg.type === "job") {
+                    watchJobEvents(msg.job_id);
+                    showCancelButton(msg.job_id);
                   } else if(msg.type === "overall_progress") {
                     const bar = document.getElementById('overallProgress');
                     bar.style.width = msg.progress + '%';
@@ -395,7 +618,7 @@ HTML_TEMPLATE = """
                   }
                 } catch(e) {}
               });
-              read();
+              if (!done) read();
             });
           }
           read();
@@ -421,19 +644,306 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# --- メトリクス ---
+# 処理段階ごとの所要時間（ヒストグラム）と件数（カウンター）をプロセス全体で集計し、/metrics で
+# Prometheus のテキスト形式として返す。ジョブごとの集計（stats）を数える incr_stat と所要時間を記録する
+# record_stage がここにも反映するため、呼び出し側の計測は1か所で済む。記録は辞書の更新だけで、
+# 書式化は /metrics の取得時にだけ行う。
+_stats_lock = threading.Lock()
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = []
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name, amount=1, labels=()):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(STAGE_BUCKETS) + 2)
+            # 該当するバケットだけを数え、累積は書式化の時に計算する
+            i = 0
+            while i < len(STAGE_BUCKETS) and value > STAGE_BUCKETS[i]:
+                i += 1
+            hist[i] += 1
+            hist[-1] += value
+
+    def gauge(self, name, help_text, func):
+        # func は取得時に呼ばれ、値または [(ラベル, 値), ...] を返す
+        self.describe(name, "gauge", help_text)
+        self._gauges.append((name, func))
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(hist) for key, hist in self._histograms.items()}
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append(format_metric_sample(name, labels, value))
+        for (name, labels), hist in histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(STAGE_BUCKETS + ("+Inf",), hist):
+                cumulative += count
+                lines.append(format_metric_sample(name + "_bucket", labels + (("le", str(bound)),), cumulative))
+            lines.append(format_metric_sample(name + "_sum", labels, round(hist[-1], 6)))
+            lines.append(format_metric_sample(name + "_count", labels, cumulative))
+        for name, func in self._gauges:
+            try:
+                value = func()
+            except Exception:
+                continue
+            if isinstance(value, list):
+                samples[name] = [format_metric_sample(name, labels, v) for labels, v in value]
+            else:
+                samples[name] = [format_metric_sample(name, (), value)]
+        out = []
+        for name in sorted(samples):
+            kind, help_text = self._meta.get(name, ("untyped", ""))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(samples[name])
+        return "\n".join(out) + "\n"
+
+def format_metric_sample(name, labels, value):
+    if labels:
+        name += "{" + ",".join(
+            f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels
+        ) + "}"
+    return f"{name} {value}"
+
+METRICS = MetricsRegistry()
+METRICS.describe("subtitle_stage_duration_seconds", "histogram",
+                 "処理段階（resolve_channel / probe / download / clean / index / jsonl / write）ごとの所要時間")
+METRICS.describe("subtitle_api_request_duration_seconds", "histogram", "Data API リクエストの所要時間")
+METRICS.describe("subtitle_api_requests_total", "counter", "Data API のリクエスト数")
+METRICS.describe("subtitle_api_response_bytes_total", "counter", "Data API から受信したレスポンス本文のバイト数")
+METRICS.describe("subtitle_videos_processed_total", "counter", "処理した動画の数（結果別）")
+METRICS.describe("subtitle_tracks_total", "counter", "取得した字幕トラックの数（manual / auto 別。auto は手動字幕が無い場合の代替）")
+METRICS.describe("subtitle_cache_lookups_total", "counter", "字幕キャッシュの参照数（hit / miss）")
+METRICS.describe("subtitle_failures_total", "counter", "字幕取得の失敗数（理由別）")
+METRICS.describe("subtitle_retries_total", "counter", "字幕取得の再試行の原因となった事象の数（throttled / timeout）")
+METRICS.describe("subtitle_singleflight_shared_total", "counter", "他のジョブの取得結果を共有した動画の数")
+METRICS.describe("subtitle_output_bytes_total", "counter", "出力ファイルに書き出したバイト数（形式別）")
+METRICS.describe("subtitle_search_indexed_total", "counter", "全文検索の索引に登録した字幕の数")
+METRICS.describe("subtitle_jobs_total", "counter", "終了したジョブの数（状態別）")
+
+# incr_stat のキーと、反映するメトリクス（名前, ラベル）の対応
+STAT_METRICS = {
+    "track_manual": ("subtitle_tracks_total", (("kind", "manual"),)),
+    "track_auto": ("subtitle_tracks_total", (("kind", "auto"),)),
+    "cache_hits": ("subtitle_cache_lookups_total", (("result", "hit"),)),
+    "cache_misses": ("subtitle_cache_lookups_total", (("result", "miss"),)),
+    "videos_with_subtitles": ("subtitle_videos_processed_total", (("result", "subtitles"),)),
+    "videos_without_subtitles": ("subtitle_videos_processed_total", (("result", "no_subtitles"),)),
+    "skipped_no_captions": ("subtitle_videos_processed_total", (("result", "skipped"),)),
+    "failed_probe": ("subtitle_failures_total", (("reason", "probe"),)),
+    "failed_download": ("subtitle_failures_total", (("reason", "download"),)),
+    "failed_timeout": ("subtitle_failures_total", (("reason", "timeout"),)),
+    "failed_throttled": ("subtitle_failures_total", (("reason", "throttled"),)),
+    "search_index_errors": ("subtitle_failures_total", (("reason", "search_index"),)),
+    "throttled": ("subtitle_retries_total", (("cause", "throttled"),)),
+    "timeouts": ("subtitle_retries_total", (("cause", "timeout"),)),
+    "singleflight_shared": ("subtitle_singleflight_shared_total", ()),
+    "output_bytes_markdown": ("subtitle_output_bytes_total", (("format", "markdown"),)),
+    "output_bytes_jsonl": ("subtitle_output_bytes_total", (("format", "jsonl"),)),
+    "search_indexed": ("subtitle_search_indexed_total", ()),
+}
+
+class JobStats(dict):
+    # ジョブごとの件数の集計（dict として NDJSON にそのまま出す）と、処理段階ごとの所要時間の集計
+    def __init__(self):
+        super().__init__()
+        self.timings = {}
+
+    def timing_summary(self):
+        with _stats_lock:
+            return {stage: {"count": count, "total_seconds": round(total, 3),
+                            "mean_seconds": round(total / count, 4) if count else 0.0,
+                            "max_seconds": round(longest, 3)}
+                    for stage, (count, total, longest) in sorted(self.timings.items())}
+
+def record_stage(stats, stage, seconds):
+    METRICS.observe("subtitle_stage_duration_seconds", seconds, (("stage", stage),))
+    timings = getattr(stats, "timings", None)
+    if timings is None:
+        return
+    with _stats_lock:
+        entry = timings.get(stage)
+        if entry is None:
+            timings[stage] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+class StageTimer:
+    # with StageTimer(stats, "probe"): ... の所要時間を record_stage に記録する
+    __slots__ = ("stats", "stage", "start")
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.stats, self.stage, time.perf_counter() - self.start)
+        return False
+
 # --- YouTube API／字幕取得関連の関数 ---
 def get_youtube_client(api_key):
+    import googleapiclient.discovery
     return googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
 
-def extract_channel_id(url, api_key, youtube_client=None):
+# --- Data API 呼び出しの節約 ---
+# 各リクエストに fields でレスポンスの項目を絞り、一覧ページは ETag とともに保存して
+# 再実行時は If-None-Match で再検証する（304 ならキャッシュを返す）。
+# 消費したクォータと受信したレスポンス本文のバイト数は実行ごとに ApiUsage に記録する。
+API_QUOTA_COSTS = {"search.list": 100, "channels.list": 1, "playlistItems.list": 1, "videos.list": 1}
+API_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".subtitle_app_api_cache.sqlite3")
+API_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+PLAYLIST_ITEMS_FIELDS = ("etag,nextPageToken,pageInfo/totalResults,"
+                         "items(snippet(title,resourceId/videoId,videoOwnerChannelTitle),contentDetails/videoPublishedAt)")
+
+class ApiUsage:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.units = 0
+        self.requests = 0
+        self.bytes = 0
+        self.not_modified = 0
+        self.seconds = 0.0
+
+    def record(self, method, size, not_modified=False, seconds=0.0):
+        with self._lock:
+            self.units += API_QUOTA_COSTS.get(method, 1)
+            self.requests += 1
+            self.bytes += size
+            self.seconds += seconds
+            if not_modified:
+                self.not_modified += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {"units": self.units, "requests": self.requests, "bytes": self.bytes,
+                    "not_modified": self.not_modified, "seconds": round(self.seconds, 3)}
+
+class ApiPageCache:
+    def __init__(self, path=API_CACHE_PATH, max_age=API_CACHE_MAX_AGE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                body TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        # 長く使われていないページ（削除されたプレイリストなど）は開くときに捨てる
+        self._conn.execute("DELETE FROM pages WHERE last_access < ?", (time.time() - max_age,))
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT etag, body FROM pages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def touch(self, key):
+        with self._lock:
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+    def put(self, key, etag, body):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, etag, body, last_access) VALUES (?, ?, ?, ?)",
+                (key, etag, json.dumps(body, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def open_api_page_cache(config):
+    if not config.get("api_cache_enabled", True):
+        return None
+    try:
+        return ApiPageCache(path=config.get("api_cache_path", API_CACHE_PATH))
+    except sqlite3.Error:
+        return None
+
+def record_api_request(method, start, result):
+    elapsed = time.perf_counter() - start
+    METRICS.observe("subtitle_api_request_duration_seconds", elapsed, (("method", method),))
+    METRICS.inc("subtitle_api_requests_total", 1, (("method", method), ("result", result)))
+    return elapsed
+
+def execute_api_request(req, method, usage=None, page_cache=None, cache_key=None):
+    import googleapiclient.errors
+    cached = page_cache.get(cache_key) if page_cache is not None and cache_key else None
+    if cached is not None and hasattr(req, "headers"):
+        req.headers["If-None-Match"] = cached[0]
+    received = []
+    if hasattr(req, "postproc"):
+        # JSON に変換される前の本文の長さを記録する
+        postproc = req.postproc
+        def counting_postproc(resp, content):
+            received.append(len(content))
+            return postproc(resp, content)
+        req.postproc = counting_postproc
+    start = time.perf_counter()
+    try:
+        resp = req.execute()
+    except googleapiclient.errors.HttpError as e:
+        elapsed = record_api_request(method, start, "not_modified" if e.resp.status == 304 else "error")
+        if cached is not None and e.resp.status == 304:
+            if usage is not None:
+                usage.record(method, 0, not_modified=True, seconds=elapsed)
+            page_cache.touch(cache_key)
+            return cached[1]
+        raise
+    elapsed = record_api_request(method, start, "ok")
+    size = received[0] if received else None
+    if usage is not None:
+        if size is None:
+            size = len(json.dumps(resp).encode("utf-8"))
+        usage.record(method, size, seconds=elapsed)
+    if size:
+        METRICS.inc("subtitle_api_response_bytes_total", size, (("method", method),))
+    if page_cache is not None and cache_key and resp.get("etag"):
+        page_cache.put(cache_key, resp["etag"], resp)
+    return resp
+
+def extract_channel_id(url, api_key, youtube_client=None, usage=None):
     if youtube_client is None:
         youtube_client = get_youtube_client(api_key)
     if "/channel/" in url:
         return url.split("/channel/")[1].split("/")[0]
     elif "/user/" in url:
         username = url.split("/user/")[1].split("/")[0]
-        req = youtube_client.channels().list(part="id", forUsername=username)
-        resp = req.execute()
+        req = youtube_client.channels().list(part="id", forUsername=username, fields="items/id")
+        resp = execute_api_request(req, "channels.list", usage)
         items = resp.get("items", [])
         if not items:
             raise ValueError("チャンネルが見つかりません。")
@@ -442,17 +952,81 @@ def extract_channel_id(url, api_key, youtube_client=None):
         start = url.find("/@") + 2
         end = url.find("/", start)
         handle = url[start:] if end == -1 else url[start:end]
-        req = youtube_client.search().list(part="snippet", q=handle, type="channel", maxResults=1)
-        resp = req.execute()
+        handle = urllib.parse.unquote(handle.split("?")[0])
+        # search().list（100 ユニット・曖昧一致）ではなく、handle の完全一致で引く（1 ユニット）
+        req = youtube_client.channels().list(part="id", forHandle="@" + handle, fields="items/id")
+        resp = execute_api_request(req, "channels.list", usage)
         items = resp.get("items", [])
         if not items:
             raise ValueError("handleからチャンネルが見つかりません。")
-        return items[0]["id"]["channelId"]
+        return items[0]["id"]
     elif "/c/" in url:
-        raise ValueError("カスタムURL（/c/）の解決には未対応です。")
+        name = url.split("/c/")[1].split("/")[0].split("?")[0]
+        return resolve_custom_url(name)
     else:
         raise ValueError("URL形式が認識できません。")
 
+CUSTOM_URL_CHANNEL_REGEX = re.compile(
+    r'<link rel="canonical" href="https://www\.youtube\.com/channel/(UC[\w-]{22})"|"externalId":"(UC[\w-]{22})"'
+)
+
+def resolve_custom_url(name):
+    # カスタム URL（/c/）を引ける Data API は無いため、チャンネルページの canonical から取り出す
+    page_url = "https://www.youtube.com/c/" + urllib.parse.quote(urllib.parse.unquote(name))
+    req = urllib.request.Request(page_url, headers={"Accept-Language": "ja", "Cookie": "CONSENT=YES+"})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            page = resp.read().decode("utf-8", "replace")
+    except OSError:
+        raise ValueError("カスタムURL（/c/）のチャンネルページを取得できませんでした。")
+    m = CUSTOM_URL_CHANNEL_REGEX.search(page)
+    if not m:
+        raise ValueError("カスタムURL（/c/）からチャンネルが見つかりません。")
+    return m.group(1) or m.group(2)
+
+# --- チャンネル解決のキャッシュ ---
+# チャンネル URL → チャンネル ID → アップロード再生リスト ID の対応は変わらないため、
+# 一度解決したものは保存しておき、次回からは Data API を呼ばずに使う。
+CHANNEL_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".subtitle_app_channels.json")
+
+def load_channel_cache():
+    if os.path.exists(CHANNEL_CACHE_PATH):
+        with open(CHANNEL_CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_channel_cache(cache):
+    with open(CHANNEL_CACHE_PATH, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+
+def channel_cache_key(url):
+    # 同じチャンネルを指す URL の表記ゆれ（末尾の /videos、クエリ、大文字小文字）をまとめる
+    path = urllib.parse.unquote(urllib.parse.urlparse(url).path)
+    parts = [p for p in path.split("/") if p]
+    if not parts:
+        return None
+    if parts[0].startswith("@"):
+        return "handle:" + parts[0][1:].lower()
+    if parts[0] in ("channel", "user", "c") and len(parts) > 1:
+        name = parts[1] if parts[0] == "channel" else parts[1].lower()
+        return parts[0] + ":" + name
+    return None
+
+def resolve_channel(url, api_key, youtube_client=None, usage=None, use_cache=True):
+    # (チャンネル ID, アップロード再生リスト ID, キャッシュから取得したか) を返す
+    key = channel_cache_key(url) if use_cache else None
+    if key:
+        entry = load_channel_cache().get(key)
+        if entry:
+            return entry["channel_id"], entry["uploads_playlist_id"], True
+    channel_id = extract_channel_id(url, api_key, youtube_client=youtube_client, usage=usage)
+    uploads_playlist_id = get_uploads_playlist_id(channel_id, api_key, youtube_client=youtube_client, usage=usage)
+    if key:
+        cache = load_channel_cache()
+        cache[key] = {"channel_id": channel_id, "uploads_playlist_id": uploads_playlist_id, "resolved_at": time.time()}
+        save_channel_cache(cache)
+    return channel_id, uploads_playlist_id, False
+
 def extract_playlist_id(url):
     parsed = urllib.parse.urlparse(url)
     query = urllib.parse.parse_qs(parsed.query)
@@ -460,180 +1034,2896 @@ def extract_playlist_id(url):
         return query['list'][0]
     return None
 
-def get_uploads_playlist_id(channel_id, api_key, youtube_client=None):
+def get_uploads_playlist_id(channel_id, api_key, youtube_client=None, usage=None):
     if youtube_client is None:
         youtube_client = get_youtube_client(api_key)
-    req = youtube_client.channels().list(part="contentDetails", id=channel_id)
-    resp = req.execute()
+    req = youtube_client.channels().list(part="contentDetails", id=channel_id,
+                                         fields="items/contentDetails/relatedPlaylists/uploads")
+    resp = execute_api_request(req, "channels.list", usage)
     items = resp.get("items", [])
     if not items:
         raise ValueError("チャンネル情報が見つかりません。")
     return items[0]["contentDetails"]["relatedPlaylists"]["uploads"]
 
-def get_video_list(playlist_id, api_key, youtube_client=None):
+def fetch_video_page(playlist_id, youtube_client, page_token=None, known_ids=(), usage=None, page_cache=None,
+                     since=None, until=None, chronological=False):
+    # 1ページ分を取得し、(動画リスト, 次ページのトークン, totalResults) を返す。
+    # known_ids に含まれる動画に到達した場合はそこで打ち切り、次ページのトークンは None にする。
+    # since / until（datetime）の範囲外の動画は返さない。chronological（新しい順に並ぶアップロード再生リスト）
+    # の場合は since より古い動画に到達した時点で打ち切る。
+    req = youtube_client.playlistItems().list(
+        part="snippet,contentDetails",
+        playlistId=playlist_id,
+        maxResults=50,
+        pageToken=page_token,
+        fields=PLAYLIST_ITEMS_FIELDS
+    )
+    resp = execute_api_request(req, "playlistItems.list", usage, page_cache,
+                               cache_key=f"playlistItems:{playlist_id}:{page_token or ''}")
+    videos = []
+    for item in resp.get("items", []):
+        video_id = item["snippet"]["resourceId"]["videoId"]
+        if video_id in known_ids:
+            return videos, None, resp.get("pageInfo", {}).get("totalResults")
+        title = item["snippet"]["title"]
+        published_at = item.get("contentDetails", {}).get("videoPublishedAt")
+        published = parse_publish_time(published_at) if published_at else None
+        if published is not None:
+            if until is not None and published >= until:
+                continue
+            if since is not None and published < since:
+                if chronological:
+                    return videos, None, resp.get("pageInfo", {}).get("totalResults")
+                continue
+        video = {"video_id": video_id, "title": title}
+        if published_at:
+            video["published_at"] = published_at
+        channel = item["snippet"].get("videoOwnerChannelTitle")
+        if channel:
+            video["channel"] = channel
+        videos.append(video)
+    return videos, resp.get("nextPageToken"), resp.get("pageInfo", {}).get("totalResults")
+
+def iter_video_list(playlist_id, api_key, youtube_client=None, known_ids=None, page_callback=None,
+                    usage=None, page_cache=None, since=None, until=None, chronological=False):
+    # ページ単位で取得しながら動画を順に返す。known_ids を渡すと、既知の動画に到達した時点で
+    # ページ送りを打ち切る（アップロード順は新しい順）。page_callback には totalResults を渡す。
     if youtube_client is None:
         youtube_client = get_youtube_client(api_key)
-    video_list = []
+    known_ids = set(known_ids or ())
     nextPageToken = None
     while True:
-        req = youtube_client.playlistItems().list(
-            part="snippet",
-            playlistId=playlist_id,
-            maxResults=50,
-            pageToken=nextPageToken
-        )
-        resp = req.execute()
-        for item in resp.get("items", []):
-            video_id = item["snippet"]["resourceId"]["videoId"]
-            title = item["snippet"]["title"]
-            video_list.append({"video_id": video_id, "title": title})
-        nextPageToken = resp.get("nextPageToken")
+        videos, nextPageToken, total_results = fetch_video_page(playlist_id, youtube_client, nextPageToken, known_ids,
+                                                                usage=usage, page_cache=page_cache, since=since,
+                                                                until=until, chronological=chronological)
+        if page_callback:
+            page_callback(total_results)
+        yield from videos
         if not nextPageToken:
             break
-    return video_list
 
-def clean_vtt(vtt_content):
-    lines = vtt_content.splitlines()
-    cleaned = []
+def get_video_list(playlist_id, api_key, youtube_client=None, known_ids=None):
+    return list(iter_video_list(playlist_id, api_key, youtube_client=youtube_client, known_ids=known_ids))
+
+# --- 動画情報の付加 ---
+# 一覧の動画に videos.list（50 本まとめて 1 ユニット）で再生時間・公開日時・手動字幕の有無・
+# 配信状態を付け加える。字幕を取れないと分かっている動画は yt-dlp に回さず、
+# 再生時間は長い動画から先に処理を始めるのに使う。
+VIDEO_DETAILS_FIELDS = ("items(id,snippet(publishedAt,liveBroadcastContent),contentDetails(duration,caption),"
+                        "liveStreamingDetails(actualStartTime,scheduledStartTime))")
+ISO8601_DURATION_REGEX = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?")
+
+def parse_iso8601_duration(value):
+    m = ISO8601_DURATION_REGEX.fullmatch(value or "")
+    if not m:
+        return None
+    days, hours, minutes, seconds = (int(g or 0) for g in m.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def enrich_videos(videos, youtube_client, usage=None):
+    for start in range(0, len(videos), 50):
+        batch = videos[start:start + 50]
+        req = youtube_client.videos().list(
+            part="snippet,contentDetails,liveStreamingDetails",
+            id=",".join(v["video_id"] for v in batch),
+            fields=VIDEO_DETAILS_FIELDS
+        )
+        resp = execute_api_request(req, "videos.list", usage)
+        details = {item["id"]: item for item in resp.get("items", [])}
+        for video in batch:
+            item = details.get(video["video_id"])
+            if item is None:
+                # 非公開・削除済みの動画は videos.list に出てこない
+                video["available"] = False
+                continue
+            content = item.get("contentDetails", {})
+            snippet = item.get("snippet", {})
+            video["duration"] = parse_iso8601_duration(content.get("duration"))
+            video["published_at"] = snippet.get("publishedAt")
+            video["has_captions"] = content.get("caption") == "true"
+            video["live"] = snippet.get("liveBroadcastContent", "none")
+            # 配信済みのアーカイブは liveBroadcastContent が none になるため liveStreamingDetails で見分ける
+            video["was_live"] = bool(item.get("liveStreamingDetails"))
+    return videos
+
+# --- 処理対象の絞り込み ---
+# /process の since / until（公開日）・limit（最大本数）・ショートとライブ配信の除外。
+# 公開日はアップロード再生リストの一覧取得時点で判定し、新しい順に並ぶことを利用して
+# 範囲より古い動画に達したらページ送りを止める。ショートとライブ配信は videos.list の結果で除く。
+SHORTS_MAX_SECONDS = 60
+
+def parse_publish_time(value):
+    # "2024-01-31" または ISO 8601 の日時（"Z" 付き可）を UTC の datetime に変換する
+    value = value.strip()
+    if len(value) == 10:
+        value += "T00:00:00"
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc)
+
+def parse_video_filters(values):
+    filters = {}
+    try:
+        since = (values.get("since") or "").strip()
+        if since:
+            filters["since"] = parse_publish_time(since).isoformat()
+        until = (values.get("until") or "").strip()
+        if until:
+            # 日付だけの指定はその日の終わりまでを含める（until は含まない側の境界として保存）
+            end = parse_publish_time(until)
+            if len(until) == 10:
+                end += datetime.timedelta(days=1)
+            filters["until"] = end.isoformat()
+    except ValueError:
+        raise ValueError("公開日の形式が正しくありません（例: 2024-01-31）。")
+    limit = (values.get("limit") or "").strip()
+    if limit:
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValueError("最大本数には1以上の整数を指定してください。")
+        filters["limit"] = int(limit)
+    for key in ("exclude_shorts", "exclude_live"):
+        if values.get(key) in ("on", "true", "1", True):
+            filters[key] = True
+    if "since" in filters and "until" in filters and filters["since"] >= filters["until"]:
+        raise ValueError("公開日の開始は終了より前にしてください。")
+    return filters
+
+def is_excluded_video(video, filters, shorts_max_seconds=SHORTS_MAX_SECONDS):
+    if filters.get("exclude_shorts") and video.get("duration") is not None and 0 < video["duration"] <= shorts_max_seconds:
+        return True
+    if filters.get("exclude_live") and (video.get("was_live") or video.get("live") in ("live", "upcoming")):
+        return True
+    return False
+
+def caption_skip_reason(video, langs, preference, cache=None):
+    # yt-dlp を起動しても字幕を取れないことが分かっている場合はその理由を返す
+    if video.get("available") is False:
+        return "非公開または削除済み"
+    if video.get("live") in ("live", "upcoming"):
+        return "配信中または配信予定"
+    # Data API の caption は手動字幕の有無しか表さないため、自動字幕も使う設定では判断に使わない
+    if video.get("has_captions") is False and "auto" not in preference:
+        return "字幕なし"
+    if cache is not None and all(cache.is_unavailable(video["video_id"], lang, preference) for lang in langs):
+        return "字幕なし（前回の確認結果）"
+    return None
+
+# --- VTT の整形 ---
+# 自動生成字幕は直前のキューの行を次のキューの先頭で繰り返す（ロールアップ表示）ため、
+# rolling モードではキュー同士の行単位の重なりと、行内の文字単位の重なりを取り除く。
+# 比較対象は直前のキューと直前に出力した行だけなので、入力長に対して線形時間で動く。
+# 手動字幕に rolling を使うと、前の行の末尾と同じ言葉で始まる台詞まで削ってしまうため、
+# 既定は連続する同一行だけを除く exact とし、rolling は自動生成字幕（auto_caption_dedup）にだけ使う。
+VTT_DEDUP_MODES = ("exact", "rolling")
+DEFAULT_AUTO_CAPTION_DEDUP = "rolling"
+OVERLAP_MIN_CHARS = 5
+
+def dedup_mode_for(kind, auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    # 字幕トラックの種類に応じた重複除去モード
+    if kind == "auto" and auto_dedup in VTT_DEDUP_MODES:
+        return auto_dedup
+    return "exact"
+
+def _clean_vtt_line(line):
+    line = TAG_REGEX.sub("", line)
+    line = TIME_REGEX.sub("", line)
+    return line.strip()
+
+def _suffix_prefix_overlap(prev, line):
+    # prev の末尾と line の先頭が一致する最長の長さ（KMP の失敗関数で線形時間）
+    if not prev or not line:
+        return 0
+    text = line + "\0" + prev[-len(line):]
+    fail = [0] * len(text)
+    k = 0
+    for i in range(1, len(text)):
+        while k and text[i] != text[k]:
+            k = fail[k - 1]
+        if text[i] == text[k]:
+            k += 1
+        fail[i] = k
+    return fail[-1]
+
+def _dedup_cue(cue, prev_cue, last_line):
+    # 直前のキュー末尾と今回のキュー先頭で重なる行を飛ばす
+    skip = 0
+    for k in range(min(len(cue), len(prev_cue)), 0, -1):
+        if prev_cue[-k:] == cue[:k]:
+            skip = k
+            break
+    out = []
+    for line in cue[skip:]:
+        if line == last_line:
+            continue
+        if last_line and last_line.endswith(line):
+            continue
+        # 重なりは line の長さ以下なので、last_line の末尾側に line の先頭が現れる位置から先だけを調べる。
+        # 候補が無い大半の行では失敗関数の計算自体を省く。
+        overlap = 0
+        if last_line:
+            pos = last_line.find(line[:OVERLAP_MIN_CHARS], max(0, len(last_line) - len(line)))
+            if pos != -1:
+                overlap = _suffix_prefix_overlap(last_line[pos:], line)
+        text = line[overlap:].strip() if overlap >= OVERLAP_MIN_CHARS else line
+        if text:
+            out.append(text)
+        last_line = line
+    return out, last_line
+
+def iter_vtt_cues(lines, dedup="exact"):
+    # キューごとに (タイミング行, 重複を除いた行のリスト) を返す。タイミング行より前のテキストは None に属する
+    timing = None
     last_line = None
+    if dedup == "exact":
+        out = []
+        for line in lines:
+            if line.startswith("WEBVTT") or line.startswith("Kind:") or line.startswith("Language:"):
+                continue
+            if "-->" in line:
+                if out:
+                    yield timing, out
+                    out = []
+                timing = line
+                continue
+            line = _clean_vtt_line(line)
+            if line and line != last_line:
+                out.append(line)
+                last_line = line
+        if out:
+            yield timing, out
+        return
+    prev_cue = []
+    cue = []
     for line in lines:
         if line.startswith("WEBVTT") or line.startswith("Kind:") or line.startswith("Language:"):
             continue
         if "-->" in line:
+            out, last_line = _dedup_cue(cue, prev_cue, last_line)
+            if out:
+                yield timing, out
+            if cue:
+                prev_cue = cue
+            cue = []
+            timing = line
             continue
-        line = TAG_REGEX.sub("", line)
-        line = TIME_REGEX.sub("", line)
-        line = line.strip()
-        if line and line != last_line:
-            cleaned.append(line)
-            last_line = line
-    return "\n".join(cleaned)
-
-def run_yt_dlp_command(command, video_id, progress_callback):
-    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        m = PROGRESS_REGEX.search(line)
-        if m and progress_callback:
+        line = _clean_vtt_line(line)
+        # 同一キュー内で同じ行が続く場合（カラオケ表示のタイミング違い）は1つにまとめる
+        if line and (not cue or cue[-1] != line):
+            cue.append(line)
+    out, last_line = _dedup_cue(cue, prev_cue, last_line)
+    if out:
+        yield timing, out
+
+def iter_clean_vtt(lines, dedup="exact"):
+    for _, out in iter_vtt_cues(lines, dedup=dedup):
+        yield from out
+
+def clean_vtt(vtt_content, dedup="exact"):
+    # 文字列は splitlines() で一括分割せず、1行ずつ読み進める
+    if isinstance(vtt_content, str):
+        vtt_content = io.StringIO(vtt_content)
+    return "\n".join(iter_clean_vtt(vtt_content, dedup=dedup))
+
+def parse_cue_time(value):
+    # "01:02:03.456" / "02:03.456" を秒に変換する
+    seconds = 0.0
+    for part in value.replace(",", ".").split(":"):
+        seconds = seconds * 60 + float(part)
+    return round(seconds, 3)
+
+def clean_vtt_cues(vtt_content, dedup="exact"):
+    # clean_vtt と同じ重複除去をしたうえで、キューごとの [開始秒, 終了秒, テキスト] のリストを返す。
+    # テキストを改行でつなぐと clean_vtt の結果と同じ行の並びになる
+    if isinstance(vtt_content, str):
+        vtt_content = io.StringIO(vtt_content)
+    cues = []
+    for timing, out in iter_vtt_cues(vtt_content, dedup=dedup):
+        m = CUE_TIMING_REGEX.search(timing or "")
+        start, end = (parse_cue_time(m.group(1)), parse_cue_time(m.group(2))) if m else (None, None)
+        cues.append([start, end, " ".join(out)])
+    return cues
+
+# --- yt-dlp プロセスの監視と取り消し ---
+# yt-dlp はプロセスグループごと起動し、ジョブの取り消し時や、1回の取得が fetch_timeout 秒を超えた場合、
+# 出力が stall_timeout 秒途絶えた場合にグループごと終了させる。タイムアウトした取得は再試行する。
+# yt-dlp -J は終了するまで何も出力しないため、メタデータ取得では出力の途絶を見ずに fetch_timeout だけで打ち切り、
+# 通信の停滞は --socket-timeout で yt-dlp 自身に検出させる。
+DEFAULT_FETCH_TIMEOUT = 300
+DEFAULT_STALL_TIMEOUT = 60
+DEFAULT_TIMEOUT_RETRIES = 2
+
+class YtDlpTimeoutError(Exception):
+    pass
+
+class JobCancelledError(Exception):
+    pass
+
+def popen_process_group_kwargs():
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+def kill_process_group(proc):
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "nt":
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+class JobControl:
+    # ジョブの取り消し状態と、そのジョブが起動中の yt-dlp プロセスを管理する
+    def __init__(self, fetch_timeout=DEFAULT_FETCH_TIMEOUT, stall_timeout=DEFAULT_STALL_TIMEOUT,
+                 timeout_retries=DEFAULT_TIMEOUT_RETRIES):
+        self.fetch_timeout = fetch_timeout
+        self.stall_timeout = stall_timeout
+        self.timeout_retries = timeout_retries
+        self._cancelled = threading.Event()
+        self._procs = set()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self._cancelled.set()
+            procs = list(self._procs)
+            callbacks = list(self._callbacks)
+        for proc in procs:
+            kill_process_group(proc)
+        for callback in callbacks:
+            callback()
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelledError("ジョブが取り消されました。")
+
+    def sleep(self, seconds):
+        # 取り消されたら待機を打ち切る
+        if self._cancelled.wait(seconds):
+            raise JobCancelledError("ジョブが取り消されました。")
+
+    def on_cancel(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def register(self, proc):
+        with self._lock:
+            self._procs.add(proc)
+            cancelled = self._cancelled.is_set()
+        if cancelled:
+            kill_process_group(proc)
+
+    def unregister(self, proc):
+        with self._lock:
+            self._procs.discard(proc)
+
+    def deadline(self):
+        return time.monotonic() + self.fetch_timeout if self.fetch_timeout else None
+
+def create_job_control(config):
+    return JobControl(
+        fetch_timeout=config.get("fetch_timeout_seconds", DEFAULT_FETCH_TIMEOUT),
+        stall_timeout=config.get("stall_timeout_seconds", DEFAULT_STALL_TIMEOUT),
+        timeout_retries=config.get("fetch_timeout_retries", DEFAULT_TIMEOUT_RETRIES)
+    )
+
+def check_watchdog(control, deadline, last_output):
+    # 取り消し・タイムアウトを検出したら例外を送出する。last_output が None なら出力の途絶は見ない
+    control.check()
+    now = time.monotonic()
+    if deadline is not None and now > deadline:
+        raise YtDlpTimeoutError(f"{control.fetch_timeout} 秒以内に取得が終わりませんでした。")
+    if control.stall_timeout and last_output is not None and now - last_output > control.stall_timeout:
+        raise YtDlpTimeoutError(f"yt-dlp の出力が {control.stall_timeout} 秒間ありませんでした。")
+
+def run_watched_command(command, control=None, deadline=None, stall_check=True):
+    # command を実行して (終了コード, 標準出力, 標準エラー出力) を返す。
+    # 出力は別スレッドで読み、その間に取り消しとタイムアウトを監視する。
+    # 終了まで何も出力しないコマンドでは stall_check=False にして、出力の途絶による打ち切りを行わない
+    if control is None:
+        control = JobControl()
+    control.check()
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **popen_process_group_kwargs())
+    output = {proc.stdout: [], proc.stderr: []}
+    last_output = [time.monotonic()]
+
+    def pump(stream):
+        for chunk in iter(lambda: stream.read1(65536), b""):
+            output[stream].append(chunk)
+            last_output[0] = time.monotonic()
+
+    readers = [threading.Thread(target=pump, args=(stream,), daemon=True) for stream in output]
+    for reader in readers:
+        reader.start()
+    control.register(proc)
+    try:
+        while True:
             try:
-                progress = float(m.group(1))
-                progress_callback(video_id, progress)
-            except Exception:
-                pass
-    proc.wait()
+                proc.wait(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                check_watchdog(control, deadline, last_output[0] if stall_check else None)
+    except BaseException:
+        kill_process_group(proc)
+        proc.wait()
+        raise
+    finally:
+        control.unregister(proc)
+        for reader in readers:
+            reader.join(timeout=5)
+    # 取り消しでプロセスが終了させられた場合は、失敗した出力を返さずに取り消しとして扱う
+    control.check()
+    return (proc.returncode, b"".join(output[proc.stdout]).decode("utf-8", "replace"),
+            b"".join(output[proc.stderr]).decode("utf-8", "replace"))
 
-def download_and_clean_subtitles(video_id, lang="ja", progress_callback=None):
+async def run_watched_command_async(command, control=None, deadline=None, stall_check=True):
+    # run_watched_command の asyncio 版
+    if control is None:
+        control = JobControl()
+    control.check()
+    # 起動の途中で取り消されても、起動したプロセスを見失わずに終了・回収できるよう起動自体は取り消させない
+    spawn = asyncio.ensure_future(asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, **popen_process_group_kwargs()
+    ))
+    try:
+        proc = await asyncio.shield(spawn)
+    except asyncio.CancelledError:
+        proc = await spawn
+        kill_process_group(proc)
+        await proc.communicate()
+        raise
+    output = {proc.stdout: [], proc.stderr: []}
+    last_output = [time.monotonic()]
+
+    async def pump(stream):
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                return
+            output[stream].append(chunk)
+            last_output[0] = time.monotonic()
+
+    readers = asyncio.ensure_future(asyncio.gather(*(pump(stream) for stream in output)))
+    control.register(proc)
+    try:
+        while True:
+            done, _ = await asyncio.wait({readers}, timeout=0.5)
+            if done:
+                break
+            check_watchdog(control, deadline, last_output[0] if stall_check else None)
+        await proc.wait()
+    except BaseException:
+        # プロセスグループを終了させ、パイプを読み切ってから回収する。
+        # 読み切る前にループが閉じると、残ったトランスポートの後始末が閉じたループで失敗する
+        kill_process_group(proc)
+        await asyncio.wait({readers}, timeout=5)
+        readers.cancel()
+        await asyncio.gather(readers, return_exceptions=True)
+        await proc.wait()
+        raise
+    finally:
+        control.unregister(proc)
+    control.check()
+    return (proc.returncode, b"".join(output[proc.stdout]).decode("utf-8", "replace"),
+            b"".join(output[proc.stderr]).decode("utf-8", "replace"))
+
+# --- yt-dlp インプロセスエンジン ---
+# 動画ごとに yt-dlp プロセスを起動するとインタプリタ起動とエクストラクタの import が
+# 毎回発生するため、ワーカースレッドごとに YoutubeDL インスタンスを保持して使い回す。
+YT_DLP_BACKENDS = ("subprocess", "inprocess")
+
+class _SilentYtDlpLogger:
+    # 失敗は戻り値・例外で扱うため、yt-dlp 自身のエラー出力は抑止する
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+YDL_PARAMS = {
+    "skip_download": True,
+    "quiet": True,
+    "no_warnings": True,
+    "noprogress": True,
+    # インプロセス版はプロセスを終了できないため、通信が途絶えた場合は yt-dlp 自身のタイムアウトに任せる
+    "socket_timeout": DEFAULT_STALL_TIMEOUT,
+    "logger": _SilentYtDlpLogger(),
+}
+_ydl_local = threading.local()
+
+def is_inprocess_backend_available():
+    try:
+        import yt_dlp  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def create_youtube_dl():
+    import yt_dlp
+    return yt_dlp.YoutubeDL(dict(YDL_PARAMS))
+
+def get_pooled_youtube_dl():
+    ydl = getattr(_ydl_local, "ydl", None)
+    if ydl is None:
+        ydl = create_youtube_dl()
+        _ydl_local.ydl = ydl
+    return ydl
+
+# --- 適応的な同時実行制御 ---
+# 処理はネットワーク律速なので、CPU 数ではなく応答状況に応じて同時実行数を AIMD で調整する。
+# 応答が健全な間は 1 ウィンドウあたり +1 ずつ増やし、429 / Too Many Requests を検出したら半減させて
+# ジッター付きの指数バックオフ後に再試行する。max_rps を指定すると全体の開始レートも制限する。
+THROTTLE_REGEX = re.compile(r"\b429\b|Too Many Requests", re.IGNORECASE)
+
+class YtDlpThrottledError(Exception):
+    pass
+
+class AdaptiveScheduler:
+    def __init__(self, min_workers=1, max_workers=32, initial_workers=4, max_rps=None,
+                 max_retries=5, backoff_base=1.0, backoff_max=60.0, latency_tolerance=3.0):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.limit = float(min(max(initial_workers, self.min_workers), self.max_workers))
+        self.max_rps = max_rps
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency_tolerance = latency_tolerance
+        self.active = 0
+        self.throttle_count = 0
+        self._latency_ewma = None
+        self._latency_floor = None
+        self._error_ewma = 0.0
+        self._last_decrease = 0.0
+        self._next_start = 0.0
+        self._cond = threading.Condition()
+        self._rate_lock = threading.Lock()
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= int(self.limit):
+                self._cond.wait()
+            self.active += 1
+        delay = self.reserve_start()
+        if delay:
+            time.sleep(delay)
+
+    def try_acquire(self):
+        # 待たずに枠を確保できた場合のみ True（asyncio エンジンから使う。開始レートは reserve_start で別途待つ）
+        with self._cond:
+            if self.active >= int(self.limit):
+                return False
+            self.active += 1
+            return True
+
+    def reserve_start(self):
+        # max_rps を守るために開始を遅らせるべき秒数を返す
+        if not self.max_rps:
+            return 0.0
+        with self._rate_lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + 1.0 / self.max_rps
+        return start - now
+
+    def release(self, latency, outcome="ok"):
+        with self._cond:
+            self.active -= 1
+            now = time.monotonic()
+            if outcome == "throttled":
+                self.throttle_count += 1
+                # 同じ輻輳に対する連続した 429 で何度も半減させないよう、直近の応答時間ぶんは据え置く
+                if now - self._last_decrease > (self._latency_ewma or 1.0):
+                    self.limit = max(float(self.min_workers), self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self._error_ewma = self._error_ewma * 0.9 + (0.1 if outcome == "error" else 0.0)
+                if outcome == "ok":
+                    if self._latency_ewma is None:
+                        self._latency_ewma = latency
+                    else:
+                        self._latency_ewma = self._latency_ewma * 0.8 + latency * 0.2
+                    if self._latency_floor is None or self._latency_ewma < self._latency_floor:
+                        self._latency_floor = self._latency_ewma
+                if self._healthy():
+                    self.limit = min(float(self.max_workers), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def _healthy(self):
+        if self._error_ewma > 0.2:
+            return False
+        if self._latency_ewma is None or self._latency_floor is None:
+            return True
+        return self._latency_ewma <= self._latency_floor * self.latency_tolerance
+
+    def backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.5)
+
+def create_scheduler(config):
+    return AdaptiveScheduler(
+        min_workers=config.get("min_workers", 1),
+        max_workers=config.get("max_workers", 32),
+        initial_workers=config.get("initial_workers", 4),
+        max_rps=config.get("max_requests_per_second"),
+        max_retries=config.get("throttle_max_retries", 5)
+    )
+
+# --- 字幕トラックの選択 ---
+# 1回のメタデータ取得で手動字幕と自動生成字幕の一覧を得て、優先順位に従って1トラックだけ取得する。
+# yt-dlp のメタデータは取れたが、優先順位に挙げたどの種類の字幕トラックも無かったことを表す
+NO_TRACK = "none"
+SUBTITLE_TRACK_KINDS = {"manual": "subtitles", "auto": "automatic_captions"}
+DEFAULT_SUBTITLE_PREFERENCE = ["manual", "auto"]
+
+def notify_progress(progress_callback, video_id, progress, stage):
+    # progress_callback(video_id, 進捗%, 段階)。段階は waiting / probing / downloading / cleaning /
+    # done のほか、cached（キャッシュ）・shared（他のジョブの取得結果）・skipped（字幕なし）・throttled
+    if progress_callback:
+        progress_callback(video_id, progress, stage)
+
+def incr_stat(stats, key, amount=1):
+    metric = STAT_METRICS.get(key)
+    if metric is not None:
+        METRICS.inc(metric[0], amount, metric[1])
+    if stats is None:
+        return
+    with _stats_lock:
+        stats[key] = stats.get(key, 0) + amount
+
+def probe_video_info_inprocess(video_id, control=None):
     video_url = f"https://www.youtube.com/watch?v={video_id}"
-    output_template = f"{video_id}.%(ext)s"
-    command_manual = [
-        "yt-dlp",
-        "--skip-download",
-        "--write-sub",
-        "--sub-lang", lang,
-        "--convert-subs", "vtt",
-        "--newline",
-        "-o", output_template,
-        video_url
-    ]
-    run_yt_dlp_command(command_manual, video_id, progress_callback)
-    subtitle_file = f"{video_id}.{lang}.vtt"
-    if not os.path.exists(subtitle_file):
-        command_auto = [
-            "yt-dlp",
-            "--skip-download",
-            "--write-auto-sub",
-            "--sub-lang", lang,
-            "--convert-subs", "vtt",
-            "--newline",
-            "-o", output_template,
-            video_url
-        ]
-        run_yt_dlp_command(command_auto, video_id, progress_callback)
-        if not os.path.exists(subtitle_file):
-            return None
+    if control is not None:
+        control.check()
+    ydl = get_pooled_youtube_dl()
     try:
-        with open(subtitle_file, "r", encoding="utf-8") as f:
-            content = f.read()
-    except Exception:
+        return ydl.extract_info(video_url, download=False, process=False)
+    except Exception as e:
+        if THROTTLE_REGEX.search(str(e)):
+            raise YtDlpThrottledError(str(e))
+        return None
+
+def yt_dlp_probe_command(video_id, control=None):
+    command = ["yt-dlp", "-J", "--skip-download", "--no-warnings"]
+    if control is not None and control.stall_timeout:
+        command += ["--socket-timeout", str(control.stall_timeout)]
+    return command + [f"https://www.youtube.com/watch?v={video_id}"]
+
+def probe_video_info_subprocess(video_id, control=None, deadline=None):
+    try:
+        returncode, stdout, stderr = run_watched_command(yt_dlp_probe_command(video_id, control), control, deadline,
+                                                         stall_check=False)
+    except OSError:
+        return None
+    if control is not None:
+        control.check()
+    if returncode != 0 and THROTTLE_REGEX.search(stderr):
+        raise YtDlpThrottledError(stderr.strip())
+    try:
+        return json.loads(stdout)
+    except ValueError:
+        return None
+
+def select_subtitle_track(info, lang, preference=None):
+    if preference is None:
+        preference = DEFAULT_SUBTITLE_PREFERENCE
+    for kind in preference:
+        key = SUBTITLE_TRACK_KINDS.get(kind)
+        if key is None:
+            continue
+        tracks = (info.get(key) or {}).get(lang) or []
+        track = next((t for t in tracks if t.get("ext") == "vtt"), None)
+        if track is not None:
+            return kind, track
+    return None, None
+
+def has_subtitle_track(info, lang, kind):
+    return bool((info.get(SUBTITLE_TRACK_KINDS[kind]) or {}).get(lang))
+
+def fetch_subtitle_track(track, backend="subprocess", control=None):
+    content = track.get("data")
+    if content is not None:
+        return content
+    if control is not None:
+        control.check()
+    try:
+        if backend == "inprocess":
+            with get_pooled_youtube_dl().urlopen(track["url"]) as resp:
+                return resp.read().decode("utf-8")
+        timeout = control.stall_timeout if control is not None and control.stall_timeout else 30
+        with urllib.request.urlopen(track["url"], timeout=timeout) as resp:
+            return resp.read().decode("utf-8")
+    except Exception as e:
+        if getattr(e, "code", None) == 429 or getattr(getattr(e, "response", None), "status", None) == 429 \
+                or THROTTLE_REGEX.search(str(e)):
+            raise YtDlpThrottledError(str(e))
         return None
-    cleaned = clean_vtt(content)
-    os.remove(subtitle_file)
+
+def fetch_subtitles_once(video_id, langs=("ja",), backend="subprocess", preference=None, stats=None, first_only=False,
+                         progress_callback=None, control=None):
+    # 1回のメタデータ取得で langs の字幕トラックをまとめて取る。{言語: (本文, 種類)} を返し、
+    # トラックが無い言語は (None, NO_TRACK)。first_only の場合は最初に取れた言語で止める。
+    if control is None:
+        control = JobControl()
+    deadline = control.deadline()
+    notify_progress(progress_callback, video_id, 10.0, "probing")
+    with StageTimer(stats, "probe"):
+        if backend == "inprocess":
+            info = probe_video_info_inprocess(video_id, control)
+        else:
+            info = probe_video_info_subprocess(video_id, control, deadline)
+    if not info:
+        incr_stat(stats, "failed_probe")
+        return {}
+    # 従来は手動字幕が無いと yt-dlp を自動字幕用にもう一度起動していた
+    if not has_subtitle_track(info, langs[0], "manual"):
+        incr_stat(stats, "second_invocations_avoided")
+    results = {}
+    for i, lang in enumerate(langs):
+        kind, track = select_subtitle_track(info, lang, preference)
+        if track is None:
+            results[lang] = (None, NO_TRACK)
+            continue
+        if deadline is not None and time.monotonic() > deadline:
+            raise YtDlpTimeoutError(f"{control.fetch_timeout} 秒以内に取得が終わりませんでした。")
+        notify_progress(progress_callback, video_id, 50.0 + 40.0 * i / len(langs), "downloading")
+        with StageTimer(stats, "download"):
+            content = fetch_subtitle_track(track, backend=backend, control=control)
+        if content is None:
+            incr_stat(stats, "failed_download")
+        results[lang] = (content, kind if content is not None else None)
+        if first_only and content is not None:
+            break
+    return results
+
+def fetch_subtitles(video_id, langs=("ja",), progress_callback=None, backend="subprocess", preference=None, stats=None,
+                    scheduler=None, first_only=False, control=None):
+    # yt-dlp パッケージが import できない環境ではサブプロセス版にフォールバックする
+    if backend == "inprocess" and not is_inprocess_backend_available():
+        backend = "subprocess"
+    if control is None:
+        control = JobControl()
+    attempt = 0
+    timeouts = 0
+    while True:
+        if scheduler is not None:
+            notify_progress(progress_callback, video_id, 0.0, "waiting")
+            scheduler.acquire()
+        start = time.monotonic()
+        outcome = "error"
+        try:
+            results = fetch_subtitles_once(video_id, langs=langs, backend=backend, preference=preference,
+                                           stats=stats, first_only=first_only, progress_callback=progress_callback,
+                                           control=control)
+            outcome = subtitle_fetch_outcome(results)
+        except YtDlpThrottledError:
+            outcome = "throttled"
+        except YtDlpTimeoutError:
+            # 止まった yt-dlp は終了済み。ワーカーを塞いだままにせず、やり直す
+            incr_stat(stats, "timeouts")
+            if timeouts >= control.timeout_retries:
+                incr_stat(stats, "failed_timeout")
+                return {}
+            timeouts += 1
+            notify_progress(progress_callback, video_id, 0.0, "timeout")
+            continue
+        finally:
+            if scheduler is not None:
+                scheduler.release(time.monotonic() - start, outcome=outcome)
+        if outcome != "throttled":
+            return results
+        incr_stat(stats, "throttled")
+        if scheduler is None or attempt >= scheduler.max_retries:
+            incr_stat(stats, "failed_throttled")
+            return {}
+        notify_progress(progress_callback, video_id, 0.0, "throttled")
+        control.sleep(scheduler.backoff(attempt))
+        attempt += 1
+
+def subtitle_fetch_outcome(results):
+    # メタデータ取得やダウンロードの失敗だけを scheduler へのエラーとして扱う。
+    # 取得はできたが字幕トラックが無かった（NO_TRACK）動画は正常な応答なので ok とする
+    if not results or any(content is None and kind != NO_TRACK for content, kind in results.values()):
+        return "error"
+    return "ok"
+
+# --- 字幕キャッシュ ---
+# clean_vtt 済みのテキストを SQLite に保存する。本文は内容ハッシュで重複排除し、
+# (video_id, lang, kind) からハッシュを引く。TTL 切れは読み出し時に破棄し、
+# 合計サイズが上限を超えたら最終アクセスの古い順に追い出す。
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".subtitle_app_cache.sqlite3")
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# 字幕が無かったという結果は、後から自動字幕が付くことがあるため短めに保持する
+DEFAULT_CACHE_NEGATIVE_TTL = 24 * 60 * 60
+# 容量超過時に最終アクセスの古い順から一度に読み出して削除する件数
+CACHE_EVICT_BATCH = 64
+
+class SubtitleCache:
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_CACHE_TTL, max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                 negative_ttl=DEFAULT_CACHE_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                content_hash TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                video_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (video_id, lang, kind)
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+            CREATE INDEX IF NOT EXISTS entries_content_hash ON entries (content_hash);
+            CREATE TABLE IF NOT EXISTS missing (
+                video_id TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                checked_at REAL NOT NULL,
+                PRIMARY KEY (video_id, lang, kind)
+            );
+            CREATE INDEX IF NOT EXISTS missing_checked_at ON missing (checked_at);
+        """)
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        with self._lock:
+            self._prune_missing(time.time())
+            self._conn.commit()
+
+    def get(self, video_id, lang, kind):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT b.text, e.fetched_at, e.content_hash FROM entries e "
+                "JOIN blobs b ON b.content_hash = e.content_hash "
+                "WHERE e.video_id = ? AND e.lang = ? AND e.kind = ?",
+                (video_id, lang, kind)
+            ).fetchone()
+            if row is None:
+                return None
+            text, fetched_at, content_hash = row
+            if self.ttl is not None and now - fetched_at > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE video_id = ? AND lang = ? AND kind = ?",
+                                   (video_id, lang, kind))
+                self._release_blobs([content_hash])
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE video_id = ? AND lang = ? AND kind = ?",
+                               (now, video_id, lang, kind))
+            self._conn.commit()
+            return text
+
+    def put(self, video_id, lang, kind, text):
+        now = time.time()
+        data = text.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            cur = self._conn.execute("INSERT OR IGNORE INTO blobs (content_hash, text, size) VALUES (?, ?, ?)",
+                                     (content_hash, text, len(data)))
+            if cur.rowcount:
+                self._total_bytes += len(data)
+            old = self._conn.execute(
+                "SELECT content_hash FROM entries WHERE video_id = ? AND lang = ? AND kind = ?",
+                (video_id, lang, kind)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (video_id, lang, kind, content_hash, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, lang, kind, content_hash, now, now)
+            )
+            self._conn.execute("DELETE FROM missing WHERE video_id = ? AND lang = ? AND kind = ?",
+                               (video_id, lang, kind))
+            # 置き換えた本文だけを参照数の確認対象にし、表全体の走査は行わない
+            if old is not None and old[0] != content_hash:
+                self._release_blobs([old[0]])
+            self._evict()
+            self._conn.commit()
+
+    def is_unavailable(self, video_id, lang, kinds):
+        # kinds のどの種類の字幕も、有効期限内の確認で無かった場合に True
+        if not kinds or self.negative_ttl == 0:
+            return False
+        since = 0 if self.negative_ttl is None else time.time() - self.negative_ttl
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind FROM missing WHERE video_id = ? AND lang = ? AND checked_at >= ?",
+                (video_id, lang, since)
+            ).fetchall()
+        found = {row[0] for row in rows}
+        return all(kind in found for kind in kinds)
+
+    def put_unavailable(self, video_id, lang, kinds):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO missing (video_id, lang, kind, checked_at) VALUES (?, ?, ?, ?)",
+                [(video_id, lang, kind, now) for kind in kinds]
+            )
+            self._prune_missing(now)
+            self._conn.commit()
+
+    def _prune_missing(self, now):
+        # 有効期限の切れた「字幕なし」の記録を消す（checked_at の索引で期限切れの行だけを辿る）
+        if self.negative_ttl is None:
+            return
+        self._conn.execute("DELETE FROM missing WHERE checked_at < ?", (now - self.negative_ttl,))
+
+    def _release_blobs(self, hashes):
+        # 指定した本文のうち、どのエントリからも参照されなくなったものを消す
+        for content_hash in set(hashes):
+            row = self._conn.execute(
+                "SELECT size FROM blobs WHERE content_hash = ? "
+                "AND NOT EXISTS (SELECT 1 FROM entries WHERE content_hash = ?)",
+                (content_hash, content_hash)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+                self._total_bytes -= row[0]
+
+    def _evict(self):
+        # 最終アクセスの古いエントリを CACHE_EVICT_BATCH 件ずつ読み、超過分を賄える件数だけまとめて削除する。
+        # 本文を他のエントリと共有している場合は減らないため、上限を下回るまで繰り返す
+        if self.max_bytes is None:
+            return
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT e.video_id, e.lang, e.kind, e.content_hash, b.size FROM entries e "
+                "JOIN blobs b ON b.content_hash = e.content_hash ORDER BY e.last_access LIMIT ?",
+                (CACHE_EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            excess = self._total_bytes - self.max_bytes
+            victims = []
+            for video_id, lang, kind, content_hash, size in rows:
+                victims.append((video_id, lang, kind, content_hash))
+                excess -= size
+                if excess <= 0:
+                    break
+            self._conn.executemany("DELETE FROM entries WHERE video_id = ? AND lang = ? AND kind = ?",
+                                   [victim[:3] for victim in victims])
+            self._release_blobs([victim[3] for victim in victims])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def open_subtitle_cache(config):
+    if not config.get("cache_enabled", True):
+        return None
+    try:
+        return SubtitleCache(
+            path=config.get("cache_path", CACHE_PATH),
+            ttl=config.get("cache_ttl_seconds", DEFAULT_CACHE_TTL),
+            max_bytes=config.get("cache_max_bytes", DEFAULT_CACHE_MAX_BYTES),
+            negative_ttl=config.get("cache_negative_ttl_seconds", DEFAULT_CACHE_NEGATIVE_TTL)
+        )
+    except sqlite3.Error:
+        return None
+
+# 重複除去モードごと、またタイミング付きのキューは整形済みテキストとは別の種類としてキャッシュする
+CUES_KIND_SUFFIX = "+cues"
+
+def cache_kind(kind, timed=False, auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    kind = kind + "+" + dedup_mode_for(kind, auto_dedup)
+    return kind + CUES_KIND_SUFFIX if timed else kind
+
+def lookup_cached_subtitles(cache, video_id, lang, preference, stats=None, timed=False,
+                            auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    if cache is None:
+        return None
+    for kind in preference:
+        cached = cache.get(video_id, lang, cache_kind(kind, timed, auto_dedup))
+        if cached is not None:
+            incr_stat(stats, "cache_hits")
+            incr_stat(stats, "track_" + kind)
+            return json.loads(cached) if timed else cached
+    incr_stat(stats, "cache_misses")
+    return None
+
+def plan_subtitle_languages(cache, video_id, langs, preference, stats=None, first_only=False, timed=False,
+                            auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    # キャッシュで結果が分かる言語を results に入れ、yt-dlp で取得が必要な言語のリストを返す
+    results = {}
+    missing = []
+    for i, lang in enumerate(langs):
+        cached = lookup_cached_subtitles(cache, video_id, lang, preference, stats, timed=timed,
+                                         auto_dedup=auto_dedup)
+        if cached is not None:
+            results[lang] = cached
+            if first_only:
+                return results, []
+            continue
+        if cache is not None and cache.is_unavailable(video_id, lang, preference):
+            results[lang] = None
+            continue
+        if first_only:
+            # 優先度の高い言語が未確認なら、残りの言語もまとめて1回で確認する
+            return results, list(langs[i:])
+        missing.append(lang)
+    return results, missing
+
+def finish_subtitles(video_id, lang, content, kind, preference, stats=None, cache=None, timed=False,
+                     auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    # timed の場合は整形済みテキストの代わりにキューごとの [開始秒, 終了秒, テキスト] のリストを返す。
+    # 重複除去は自動生成字幕にだけ auto_dedup を使い、手動字幕は exact で整形する
+    if content is None:
+        # 字幕トラックが無かったことを覚えておき、次回は yt-dlp を起動しない
+        if kind == NO_TRACK and cache is not None:
+            cache.put_unavailable(video_id, lang, preference)
+        return None
+    if kind is not None:
+        incr_stat(stats, "track_" + kind)
+    dedup = dedup_mode_for(kind, auto_dedup)
+    if timed:
+        with StageTimer(stats, "clean"):
+            cleaned = clean_vtt_cues(content, dedup=dedup)
+        if cache is not None and kind is not None:
+            cache.put(video_id, lang, cache_kind(kind, timed, auto_dedup),
+                      json.dumps(cleaned, ensure_ascii=False, separators=(",", ":")))
+        return cleaned
+    with StageTimer(stats, "clean"):
+        cleaned = clean_vtt(content, dedup=dedup)
+    if cache is not None and kind is not None:
+        cache.put(video_id, lang, cache_kind(kind, auto_dedup=auto_dedup), cleaned)
     return cleaned
 
-def process_video(video, progress_callback):
-    video_id = video["video_id"]
-    title = video["title"]
-    video_url = f"https://www.youtube.com/watch?v={video_id}"
-    md = f"## [{title}]({video_url})\n\n"
-    subtitle = download_and_clean_subtitles(video_id, lang="ja", progress_callback=progress_callback)
+def finish_subtitle_languages(video_id, langs, results, fetched, preference, stats=None, cache=None, first_only=False,
+                              timed=False, auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    for lang, (content, kind) in fetched.items():
+        results[lang] = finish_subtitles(video_id, lang, content, kind, preference, stats=stats, cache=cache,
+                                         timed=timed, auto_dedup=auto_dedup)
+    results = {lang: results[lang] for lang in langs if lang in results}
+    if first_only:
+        # 優先順位で最初に取れた言語だけを残す
+        found = next((lang for lang, text in results.items() if text), None)
+        if found is not None:
+            return {found: results[found]}
+    return results
+
+# --- 全文検索 ---
+# 整形済みの字幕を動画・言語ごとに SQLite FTS5 の索引へ登録し、/search から検索する。
+# 日本語は単語の区切りが無いため trigram トークナイザを使う（3文字未満の語は LIKE で探す）。
+# 索引は process_video が字幕を取得するたびに更新し、内容が変わらない場合は書き直さない。
+SEARCH_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".subtitle_app_search.sqlite3")
+SEARCH_RESULT_LIMIT = 20
+SEARCH_SNIPPET_TOKENS = 24
+SEARCH_LIKE_CONTEXT = 40
+# snippet() の強調部分を一時的に表す私用領域の文字（HTML エスケープの後で <mark> に置き換える）
+SEARCH_MARK_OPEN = "\ue000"
+SEARCH_MARK_CLOSE = "\ue001"
+
+SEARCH_INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY,
+        video_id TEXT NOT NULL,
+        lang TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        indexed_at REAL NOT NULL,
+        UNIQUE (video_id, lang)
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS transcripts USING fts5(
+        video_id UNINDEXED, lang UNINDEXED, channel, title, text, tokenize = 'trigram'
+    );
+"""
+
+class SearchIndex:
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # 複数のジョブが同時に書き込むことがあるため、ロックの待ち時間を長めに取る
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # 検索（別の接続）が書き込み中でも読めるように WAL にする
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SEARCH_INDEX_SCHEMA)
+
+    def add(self, video, lang, text):
+        content_hash = hashlib.sha256("\0".join(
+            (video["title"], video.get("channel") or "", text)
+        ).encode("utf-8")).hexdigest()
+        with self._lock:
+            row = self._conn.execute("SELECT id, content_hash FROM documents WHERE video_id = ? AND lang = ?",
+                                     (video["video_id"], lang)).fetchone()
+            if row is not None and row[1] == content_hash:
+                return False
+            if row is None:
+                doc_id = self._conn.execute(
+                    "INSERT INTO documents (video_id, lang, content_hash, indexed_at) VALUES (?, ?, ?, ?)",
+                    (video["video_id"], lang, content_hash, time.time())
+                ).lastrowid
+            else:
+                doc_id = row[0]
+                self._conn.execute("UPDATE documents SET content_hash = ?, indexed_at = ? WHERE id = ?",
+                                   (content_hash, time.time(), doc_id))
+                self._conn.execute("DELETE FROM transcripts WHERE rowid = ?", (doc_id,))
+            self._conn.execute(
+                "INSERT INTO transcripts (rowid, video_id, lang, channel, title, text) VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_id, video["video_id"], lang, video.get("channel") or "", video["title"], text)
+            )
+            self._conn.commit()
+            return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def open_search_index(config):
+    if not config.get("search_index_enabled", True):
+        return None
+    try:
+        return SearchIndex(config.get("search_index_path", SEARCH_INDEX_PATH))
+    except sqlite3.Error:
+        return None
+
+def index_video_subtitles(search_index, video, subtitles, stats=None):
+    # subtitles は {言語: 整形済みテキスト or None}。索引の失敗で字幕の取得を止めないよう、エラーは数えるだけにする
+    if search_index is None or not isinstance(subtitles, dict):
+        return
+    with StageTimer(stats, "index"):
+        for lang, text in subtitles.items():
+            if not text:
+                continue
+            try:
+                if search_index.add(video, lang, " ".join(text.split())):
+                    incr_stat(stats, "search_indexed")
+            except sqlite3.Error:
+                incr_stat(stats, "search_index_errors")
+
+def parse_search_terms(query):
+    terms = []
+    for term in (query or "").split():
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+def render_search_snippet(snippet):
+    return (html.escape(snippet)
+            .replace(SEARCH_MARK_OPEN, "<mark>")
+            .replace(SEARCH_MARK_CLOSE, "</mark>"))
+
+def search_transcripts(query, path=SEARCH_INDEX_PATH, limit=SEARCH_RESULT_LIMIT, lang=None, channel=None):
+    # 空白区切りの語をすべて含む字幕を関連度順に返す。snippet は一致箇所を <mark> で囲んだ HTML
+    terms = parse_search_terms(query)
+    if not terms or not os.path.exists(path):
+        return []
+    conn = sqlite3.connect(f"file:{urllib.parse.quote(path)}?mode=ro", uri=True, timeout=5)
+    try:
+        filters, params = [], []
+        if lang:
+            filters.append("lang = ?")
+            params.append(lang)
+        if channel:
+            filters.append("channel = ?")
+            params.append(channel)
+        if all(len(term) >= 3 for term in terms):
+            # 各語をフレーズとして引用し、FTS5 の演算子として解釈されないようにする
+            match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            rows = conn.execute(
+                "SELECT video_id, lang, channel, title, "
+                f"snippet(transcripts, 4, ?, ?, '…', {SEARCH_SNIPPET_TOKENS}) FROM transcripts "
+                "WHERE transcripts MATCH ?" + "".join(" AND " + f for f in filters) +
+                " ORDER BY bm25(transcripts, 0, 0, 1.0, 5.0, 1.0) LIMIT ?",
+                [SEARCH_MARK_OPEN, SEARCH_MARK_CLOSE, match] + params + [limit]
+            ).fetchall()
+        else:
+            # trigram は3文字未満の語を索引から引けないため、LIKE で全件を走査する（関連度の順位は付かない）
+            likes = ["(text LIKE ? ESCAPE '\\' OR title LIKE ? ESCAPE '\\')"] * len(terms)
+            patterns = []
+            for term in terms:
+                pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                patterns += [pattern, pattern]
+            rows = conn.execute(
+                "SELECT video_id, lang, channel, title, "
+                f"substr(text, max(1, instr(text, ?) - {SEARCH_LIKE_CONTEXT}), {SEARCH_LIKE_CONTEXT * 2 + len(terms[0])}) "
+                "FROM transcripts WHERE " + " AND ".join(likes + filters) + " ORDER BY rowid DESC LIMIT ?",
+                [terms[0]] + patterns + params + [limit]
+            ).fetchall()
+            marked = []
+            for row in rows:
+                snippet = row[4]
+                for term in terms:
+                    snippet = snippet.replace(term, SEARCH_MARK_OPEN + term + SEARCH_MARK_CLOSE)
+                marked.append(row[:4] + (snippet,))
+            rows = marked
+    finally:
+        conn.close()
+    return [{
+        "video_id": video_id,
+        "url": f"https://www.youtube.com/watch?v={video_id}",
+        "title": title,
+        "channel": channel or None,
+        "lang": row_lang,
+        "snippet": render_search_snippet(snippet or "")
+    } for video_id, row_lang, channel, title, snippet in rows]
+
+# --- 取得中の動画の重複排除 ---
+# 複数のジョブが同じ動画を同時に処理する場合、先に始めた呼び出しだけが yt-dlp を実行し、
+# 後から来た呼び出しはその結果を待って共有する。
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def join(self, key):
+        # (future, leader) を返す。leader が True の呼び出し元だけが実際に処理し、finish で結果を渡す
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            return future, True
+
+    def finish(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            # 中断（CancelledError など）は待っている側へそのまま伝えず、通常の失敗として渡す
+            if not isinstance(error, Exception):
+                error = RuntimeError("取得が中断されました")
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, func):
+        # (結果, 他の呼び出しの結果を共有したか) を返す。待っていた取得が失敗した場合は自分で取得し直す
+        future, leader = self.join(key)
+        if not leader:
+            try:
+                return future.result(), True
+            except Exception:
+                return func(), False
+        try:
+            result = func()
+        except Exception as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result=result)
+        return result, False
+
+SUBTITLE_FLIGHTS = SingleFlight()
+
+def subtitle_flight_key(video_id, langs, preference, first_only):
+    return (video_id, tuple(langs), tuple(preference), first_only)
+
+def download_and_clean_subtitles(video_id, lang="ja", progress_callback=None, backend="subprocess", preference=None,
+                                 stats=None, cache=None, scheduler=None, first_only=False, control=None, timed=False,
+                                 auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    # lang に言語のリストを渡すと、1回の yt-dlp 呼び出しでまとめて取得し {言語: テキスト or None} を返す。
+    # first_only の場合はリストを優先順位とみなし、最初に取れた言語だけを返す。
+    # timed の場合、テキストの代わりにキューのリスト（clean_vtt_cues）を返す。
+    if preference is None:
+        preference = DEFAULT_SUBTITLE_PREFERENCE
+    langs = [lang] if isinstance(lang, str) else list(lang)
+    results, missing = plan_subtitle_languages(cache, video_id, langs, preference, stats, first_only=first_only,
+                                               timed=timed, auto_dedup=auto_dedup)
+    fetched = {}
+    if missing:
+        fetched, shared = SUBTITLE_FLIGHTS.do(
+            subtitle_flight_key(video_id, missing, preference, first_only),
+            lambda: fetch_subtitles(video_id, langs=missing, progress_callback=progress_callback, backend=backend,
+                                    preference=preference, stats=stats, scheduler=scheduler, first_only=first_only,
+                                    control=control)
+        )
+        if shared:
+            incr_stat(stats, "singleflight_shared")
+            notify_progress(progress_callback, video_id, 90.0, "shared")
+    else:
+        notify_progress(progress_callback, video_id, 90.0, "cached")
+    notify_progress(progress_callback, video_id, 90.0, "cleaning")
+    results = finish_subtitle_languages(video_id, langs, results, fetched, preference, stats=stats, cache=cache,
+                                        first_only=first_only, timed=timed, auto_dedup=auto_dedup)
+    if isinstance(lang, str):
+        return results.get(lang)
+    return results
+
+DEFAULT_SUBTITLE_LANGUAGES = ["ja"]
+LANGUAGE_MODES = ("all", "first")
+LANGUAGE_CODE_REGEX = re.compile(r"^[A-Za-z]{2,3}(-[A-Za-z0-9]+)*$")
+
+def parse_languages(value):
+    # "ja, en" のような指定を言語コードのリストにする（重複は除き、順序は優先順位として保つ）
+    langs = []
+    for lang in re.split(r"[\s,]+", value or ""):
+        if not lang:
+            continue
+        if not LANGUAGE_CODE_REGEX.match(lang):
+            raise ValueError(f"言語コードの形式が正しくありません: {lang}")
+        if lang not in langs:
+            langs.append(lang)
+    return langs
+
+def format_video_section(video, subtitle, skip_reason=None, languages=None):
+    # subtitle は整形済みテキスト、または {言語: テキスト or None}。
+    # 複数の言語を指定した場合は言語ごとに小見出しを付けて並べる
+    video_url = f"https://www.youtube.com/watch?v={video['video_id']}"
+    md = f"## [{video['title']}]({video_url})\n\n"
+    if isinstance(subtitle, dict):
+        if languages and len(languages) > 1 and any(subtitle.values()):
+            for lang, text in subtitle.items():
+                md += f"### {lang}\n\n"
+                md += (" ".join(text.split()) if text else "字幕が取得できませんでした。") + "\n\n"
+            return md
+        subtitle = next((text for text in subtitle.values() if text), None)
     if subtitle:
         md += " ".join(subtitle.split()) + "\n\n"
+    elif skip_reason:
+        md += f"字幕がありません（{skip_reason}）。\n\n"
     else:
         md += "字幕が取得できませんでした。\n\n"
     return md
 
-def process_and_stream(url, api_key, output_dest):
-    yield json.dumps({"type": "log", "message": "URL受信: " + url}) + "\n"
-    youtube_client = get_youtube_client(api_key)
+def skip_video_section(video, langs, preference, stats=None, cache=None):
+    # 字幕を取れないと分かっている動画は、yt-dlp を起動せずにその旨のセクションを返す
+    reason = caption_skip_reason(video, langs, preference or DEFAULT_SUBTITLE_PREFERENCE, cache)
+    if reason is None:
+        return None
+    incr_stat(stats, "skipped_no_captions")
+    return format_video_section(video, None, skip_reason=reason)
+
+def count_video_result(stats, subtitles):
+    if any(subtitles.values()):
+        incr_stat(stats, "videos_with_subtitles")
+    else:
+        incr_stat(stats, "videos_without_subtitles")
+
+def process_video(video, progress_callback, backend="subprocess", preference=None, stats=None, cache=None, scheduler=None,
+                  languages=None, first_only=False, control=None, search_index=None, structured=None,
+                  auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    languages = languages or DEFAULT_SUBTITLE_LANGUAGES
+    skipped = skip_video_section(video, languages, preference, stats=stats, cache=cache)
+    if skipped is not None:
+        notify_progress(progress_callback, video["video_id"], 100.0, "skipped")
+        return skipped
+    subtitles = download_and_clean_subtitles(video["video_id"], lang=languages, progress_callback=progress_callback,
+                                             backend=backend, preference=preference, stats=stats, cache=cache,
+                                             scheduler=scheduler, first_only=first_only, control=control,
+                                             timed=structured is not None, auto_dedup=auto_dedup)
+    if structured is not None:
+        # 構造化出力ではキューのまま受け取り、JSONL に書き出してから Markdown 用のテキストに戻す
+        subtitles = write_structured_output(structured, video, subtitles, stats)
+    index_video_subtitles(search_index, video, subtitles, stats)
+    count_video_result(stats, subtitles)
+    notify_progress(progress_callback, video["video_id"], 100.0, "done")
+    return format_video_section(video, subtitles, languages=languages)
+
+# --- asyncio エンジン ---
+# 動画ごとにスレッドを1本ずつ塞ぐ代わりに、yt-dlp を asyncio のサブプロセスとして起動し、
+# 1つのイベントループで多数の取得を同時に待つ。
+async def probe_video_info_subprocess_async(video_id, control=None, deadline=None):
     try:
-        playlist_id = extract_playlist_id(url)
-        if playlist_id:
-            yield json.dumps({"type": "log", "message": "プレイリストURL検出。動画リスト取得中..."}) + "\n"
-            video_list = get_video_list(playlist_id, api_key, youtube_client=youtube_client)
+        returncode, stdout, stderr = await run_watched_command_async(yt_dlp_probe_command(video_id, control),
+                                                                     control, deadline, stall_check=False)
+    except OSError:
+        return None
+    if control is not None:
+        control.check()
+    if returncode != 0 and THROTTLE_REGEX.search(stderr):
+        raise YtDlpThrottledError(stderr.strip())
+    try:
+        return json.loads(stdout)
+    except ValueError:
+        return None
+
+async def fetch_subtitles_once_async(video_id, langs=("ja",), backend="subprocess", preference=None, stats=None,
+                                     first_only=False, progress_callback=None, control=None):
+    if control is None:
+        control = JobControl()
+    if backend == "inprocess":
+        # インプロセス版は同期 API のため、ワーカースレッド上の YoutubeDL で実行する
+        return await asyncio.to_thread(fetch_subtitles_once, video_id, langs=langs, backend=backend,
+                                       preference=preference, stats=stats, first_only=first_only,
+                                       progress_callback=progress_callback, control=control)
+    deadline = control.deadline()
+    notify_progress(progress_callback, video_id, 10.0, "probing")
+    with StageTimer(stats, "probe"):
+        info = await probe_video_info_subprocess_async(video_id, control, deadline)
+    if not info:
+        incr_stat(stats, "failed_probe")
+        return {}
+    if not has_subtitle_track(info, langs[0], "manual"):
+        incr_stat(stats, "second_invocations_avoided")
+    results = {}
+    for i, lang in enumerate(langs):
+        kind, track = select_subtitle_track(info, lang, preference)
+        if track is None:
+            results[lang] = (None, NO_TRACK)
+            continue
+        if deadline is not None and time.monotonic() > deadline:
+            raise YtDlpTimeoutError(f"{control.fetch_timeout} 秒以内に取得が終わりませんでした。")
+        notify_progress(progress_callback, video_id, 50.0 + 40.0 * i / len(langs), "downloading")
+        if track.get("data") is not None:
+            content = track["data"]
+        else:
+            with StageTimer(stats, "download"):
+                content = await asyncio.to_thread(fetch_subtitle_track, track, backend, control)
+        if content is None:
+            incr_stat(stats, "failed_download")
+        results[lang] = (content, kind if content is not None else None)
+        if first_only and content is not None:
+            break
+    return results
+
+async def download_and_clean_subtitles_async(video_id, slots, lang="ja", backend="subprocess", preference=None,
+                                             stats=None, cache=None, scheduler=None, first_only=False,
+                                             progress_callback=None, control=None, timed=False,
+                                             auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    # slots は scheduler の空き枠を待つための asyncio.Condition。lang の扱いは download_and_clean_subtitles と同じ
+    if preference is None:
+        preference = DEFAULT_SUBTITLE_PREFERENCE
+    if backend == "inprocess" and not is_inprocess_backend_available():
+        backend = "subprocess"
+    langs = [lang] if isinstance(lang, str) else list(lang)
+    results, missing = plan_subtitle_languages(cache, video_id, langs, preference, stats, first_only=first_only,
+                                               timed=timed, auto_dedup=auto_dedup)
+    fetched = {}
+    if missing:
+        key = subtitle_flight_key(video_id, missing, preference, first_only)
+        future, leader = SUBTITLE_FLIGHTS.join(key)
+        if leader:
+            try:
+                fetched = await fetch_subtitles_with_retry_async(video_id, slots, missing, backend, preference,
+                                                                 stats, scheduler, first_only, progress_callback,
+                                                                 control)
+            except BaseException as e:
+                SUBTITLE_FLIGHTS.finish(key, future, error=e)
+                raise
+            SUBTITLE_FLIGHTS.finish(key, future, result=fetched)
+        else:
+            # 他のジョブ（別スレッドや別のイベントループ）が取得中の結果を待つ
+            try:
+                fetched = await asyncio.wrap_future(future)
+                incr_stat(stats, "singleflight_shared")
+                notify_progress(progress_callback, video_id, 90.0, "shared")
+            except Exception:
+                fetched = await fetch_subtitles_with_retry_async(video_id, slots, missing, backend, preference,
+                                                                 stats, scheduler, first_only, progress_callback,
+                                                                 control)
+    else:
+        notify_progress(progress_callback, video_id, 90.0, "cached")
+    notify_progress(progress_callback, video_id, 90.0, "cleaning")
+    # 整形は CPU を使うため、イベントループを止めないようスレッドで行う
+    results = await asyncio.to_thread(finish_subtitle_languages, video_id, langs, results, fetched, preference,
+                                      stats=stats, cache=cache, first_only=first_only, timed=timed,
+                                      auto_dedup=auto_dedup)
+    if isinstance(lang, str):
+        return results.get(lang)
+    return results
+
+async def fetch_subtitles_with_retry_async(video_id, slots, missing, backend, preference, stats, scheduler, first_only,
+                                           progress_callback=None, control=None):
+    if control is None:
+        control = JobControl()
+    fetched = {}
+    attempt = 0
+    timeouts = 0
+    while True:
+        notify_progress(progress_callback, video_id, 0.0, "waiting")
+        async with slots:
+            await slots.wait_for(scheduler.try_acquire)
+        delay = scheduler.reserve_start()
+        if delay:
+            await asyncio.sleep(delay)
+        start = time.monotonic()
+        outcome = "error"
+        try:
+            fetched = await fetch_subtitles_once_async(video_id, langs=missing, backend=backend,
+                                                       preference=preference, stats=stats, first_only=first_only,
+                                                       progress_callback=progress_callback, control=control)
+            outcome = subtitle_fetch_outcome(fetched)
+        except YtDlpThrottledError:
+            outcome = "throttled"
+        except YtDlpTimeoutError:
+            outcome = "timeout"
+        finally:
+            scheduler.release(time.monotonic() - start, outcome="error" if outcome == "timeout" else outcome)
+            async with slots:
+                slots.notify_all()
+        if outcome == "timeout":
+            incr_stat(stats, "timeouts")
+            if timeouts >= control.timeout_retries:
+                incr_stat(stats, "failed_timeout")
+                break
+            timeouts += 1
+            notify_progress(progress_callback, video_id, 0.0, "timeout")
+            continue
+        if outcome != "throttled":
+            break
+        incr_stat(stats, "throttled")
+        if attempt >= scheduler.max_retries:
+            incr_stat(stats, "failed_throttled")
+            break
+        notify_progress(progress_callback, video_id, 0.0, "throttled")
+        await asyncio.sleep(scheduler.backoff(attempt))
+        control.check()
+        attempt += 1
+    return fetched
+
+async def process_video_async(video, slots, backend="subprocess", preference=None, stats=None, cache=None, scheduler=None,
+                              languages=None, first_only=False, progress_callback=None, control=None,
+                              search_index=None, structured=None, auto_dedup=DEFAULT_AUTO_CAPTION_DEDUP):
+    languages = languages or DEFAULT_SUBTITLE_LANGUAGES
+    skipped = skip_video_section(video, languages, preference, stats=stats, cache=cache)
+    if skipped is not None:
+        notify_progress(progress_callback, video["video_id"], 100.0, "skipped")
+        return skipped
+    subtitles = await download_and_clean_subtitles_async(video["video_id"], slots, lang=languages, backend=backend,
+                                                         preference=preference, stats=stats, cache=cache,
+                                                         scheduler=scheduler, first_only=first_only,
+                                                         progress_callback=progress_callback, control=control,
+                                                         timed=structured is not None, auto_dedup=auto_dedup)
+    if structured is not None:
+        subtitles = await asyncio.to_thread(write_structured_output, structured, video, subtitles, stats)
+    # 索引への書き込みはディスク I/O を伴うため、イベントループを塞がないようスレッドで行う
+    await asyncio.to_thread(index_video_subtitles, search_index, video, subtitles, stats)
+    count_video_result(stats, subtitles)
+    notify_progress(progress_callback, video["video_id"], 100.0, "done")
+    return format_video_section(video, subtitles, languages=languages)
+
+ENGINES = ("threads", "asyncio")
+
+class AsyncioPipeline:
+    # 別スレッドでイベントループを動かし、一覧取得と字幕取得を asyncio で並行させる。
+    # マニフェストや出力ファイルには触れず、(種類, 値) のイベントをスレッドセーフなキュー経由で
+    # 呼び出し元に渡す。呼び出し元は処理が必要な動画を submit で戻す。
+    def __init__(self, list_page, process, workers, window):
+        self.list_page = list_page
+        self.process = process
+        self.workers = workers
+        self.window = window
+        self.events = Queue()
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), daemon=True)
+        self._thread.start()
+
+    def __iter__(self):
+        while True:
+            event = self.events.get()
+            if event[0] == "closed":
+                return
+            yield event
+
+    def _call(self, func, *args):
+        # 終了後に届いたイベントの後始末では、閉じたループへの呼び出しを無視する
+        try:
+            self._loop.call_soon_threadsafe(func, *args)
+        except RuntimeError:
+            pass
+
+    def submit(self, write_idx, list_idx, video, priority=(0, 0)):
+        self._call(self._work.put_nowait, (priority, write_idx, list_idx, video))
+
+    def release_window(self, count=1):
+        for _ in range(count):
+            self._call(self._window.release)
+
+    def finish(self):
+        # 一覧の投入が終わったことを各ワーカーに伝える
+        for i in range(self.workers):
+            self._call(self._work.put_nowait, ((float("inf"), 0), i, None, None))
+
+    def close(self):
+        if self._thread is None:
+            return
+        if self._loop is not None:
+            self._call(self._task.cancel)
+        self._thread.join()
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        # インプロセス版 yt-dlp や一覧取得は to_thread で動かすため、既定の実行器を同時実行数の上限に合わせる
+        self._loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=self.workers + 2))
+        # 優先度（長い動画ほど小さい値）の順にワーカーへ渡す
+        self._work = asyncio.PriorityQueue()
+        self._window = asyncio.Semaphore(self.window)
+        slots = asyncio.Condition()
+        tasks = [asyncio.ensure_future(self._lister())]
+        tasks += [asyncio.ensure_future(self._worker(slots)) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.events.put(("error", e))
+        finally:
+            # 取り消しやエラーで抜けた場合も、各ワーカーが yt-dlp を終了・回収し終えるまで待ってからループを閉じる
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.events.put(("closed", None))
+
+    async def _lister(self):
+        try:
+            page_token = None
+            while True:
+                videos, page_token, total_results = await asyncio.to_thread(self.list_page, page_token)
+                self.events.put(("page", total_results))
+                for video in videos:
+                    # 処理中と並べ替え待ちの合計が上限に達したら一覧取得を待たせる
+                    await self._window.acquire()
+                    self.events.put(("video", video))
+                if not page_token:
+                    break
+        except Exception as e:
+            self.events.put(("listing_error", e))
+        finally:
+            self.events.put(("listing_done", None))
+
+    async def _worker(self, slots):
+        while True:
+            _, write_idx, list_idx, video = await self._work.get()
+            if video is None:
+                return
+            self.events.put(("log", json.dumps({"type": "log", "message": f"開始: {video['title']}"}) + "\n"))
+            res = await self.process(video, slots)
+            self.events.put(("log", json.dumps({"type": "log", "message": f"完了: {video['title']}"}) + "\n"))
+            self.events.put(("result", (write_idx, list_idx, res)))
+
+# --- Markdown の逐次書き出し ---
+# 完了した動画のセクションを、それより前の動画がすべて揃った時点で出力先に追記する。
+# ordered=False の場合は完了順にそのまま書き出す。
+OUTPUT_ORDERS = ("playlist", "completion")
+
+class MarkdownStreamWriter:
+    def __init__(self, path, append=False, ordered=True, flush_bytes=256 * 1024, flush_interval=2.0, on_flush=None,
+                 stats=None):
+        self.path = path
+        self.stats = stats
+        self.ordered = ordered
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.pending = {}
+        self.next_idx = 0
+        self.sections_written = 0
+        self.bytes_written = 0
+        # position は書き出し済み（バッファ分を含む）の末尾のファイル内バイト位置
+        self.position = os.path.getsize(path) if append and os.path.exists(path) else 0
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_sections = []
+        self._last_flush = time.monotonic()
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def add(self, idx, section, key=None):
+        if not self.ordered:
+            self._write(section, key)
+        else:
+            self.pending[idx] = (section, key)
+            while self.next_idx in self.pending:
+                self._write(*self.pending.pop(self.next_idx))
+                self.next_idx += 1
+        if self._buffer_bytes >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _write(self, section, key=None):
+        # 既存の内容やセクションとの間には区切りの空行を入れる
+        if self.position:
+            self._buffer.append("\n")
+            self._buffer_bytes += 1
+            self.position += 1
+        size = len(section.encode("utf-8"))
+        self._buffer.append(section)
+        self._buffer_sections.append((key, self.position, size))
+        self._buffer_bytes += size
+        self.position += size
+        self.sections_written += 1
+
+    def flush(self):
+        if self._buffer:
+            with StageTimer(self.stats, "write"):
+                self._file.write("".join(self._buffer))
+                self._file.flush()
+            self.bytes_written += self._buffer_bytes
+            incr_stat(self.stats, "output_bytes_markdown", self._buffer_bytes)
+            flushed = self._buffer_sections
+            self._buffer = []
+            self._buffer_bytes = 0
+            self._buffer_sections = []
+            if self.on_flush:
+                self.on_flush(flushed, self.position)
+        self._last_flush = time.monotonic()
+
+    def close(self, discard_pending=False):
+        # 並び順モードで欠番が残った場合も、取得済みのセクションは失わずに書き出す。
+        # 中断時（discard_pending=True）は再開時の並び順を保つため書き出さない。
+        if not discard_pending:
+            for idx in sorted(self.pending):
+                self._write(*self.pending[idx])
+        self.pending = {}
+        self.flush()
+        self._file.close()
+
+# --- 構造化出力（JSONL） ---
+# Markdown と並行して、字幕のキューごと（または文ごと）に開始・終了時刻・動画ID・言語を持つ
+# JSON を1行ずつ書き出す。動画の取得が終わるたびにその動画の分だけを書き出すため、
+# 出力全体をメモリに保持しない。shard の場合は動画ごとに別ファイル（<動画ID>.jsonl）にする。
+STRUCTURED_OUTPUT_MODES = ("none", "cues", "sentences")
+SENTENCE_END_REGEX = re.compile(r"[。．！？!?.…]$")
+SENTENCE_MAX_SECONDS = 15.0
+SENTENCE_MAX_GAP = 2.0
+SENTENCE_MAX_CHARS = 200
+# 単語を空白で区切らない言語は、キューをつなぐときに空白を挟まない
+NO_SPACE_LANGUAGES = ("ja", "zh")
+
+def cues_to_text(cues):
+    if cues is None:
+        return None
+    return "\n".join(cue[2] for cue in cues)
+
+def merge_cue_sentences(cues, lang):
+    # 文末の句読点・間の空き・長さで区切りながら、連続するキューを1文にまとめる。
+    # 自動生成字幕には句読点が無いことが多いため、長さの上限で必ず区切る
+    joiner = "" if lang.split("-")[0] in NO_SPACE_LANGUAGES else " "
+    current = None
+    for start, end, text in cues:
+        if current is not None and (
+            SENTENCE_END_REGEX.search(current[2])
+            or len(current[2]) >= SENTENCE_MAX_CHARS
+            or (start is not None and current[1] is not None and start - current[1] > SENTENCE_MAX_GAP)
+            or (end is not None and current[0] is not None and end - current[0] > SENTENCE_MAX_SECONDS)
+        ):
+            yield current
+            current = None
+        if current is None:
+            current = [start, end, text]
+        else:
+            current[1] = end
+            current[2] += joiner + text
+    if current is not None:
+        yield current
+
+def structured_output_path(output_dest, shard=False):
+    return os.path.splitext(output_dest)[0] + (".jsonl.d" if shard else ".jsonl")
+
+def prune_jsonl(path, drop_ids):
+    # drop_ids の動画のレコードと、書き込み途中で切れた行を取り除く（1行ずつ読み書きする）
+    tmp_path = path + ".tmp"
+    with open(path, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            if not line.endswith("\n"):
+                continue
+            try:
+                if json.loads(line).get("video_id") in drop_ids:
+                    continue
+            except ValueError:
+                continue
+            dst.write(line)
+    os.replace(tmp_path, path)
+
+class StructuredOutputWriter:
+    def __init__(self, path, mode="cues", shard=False, truncate=False, drop_ids=()):
+        self.path = path
+        self.mode = mode
+        self.shard = shard
+        self.records_written = 0
+        self._lock = threading.Lock()
+        self._file = None
+        if shard:
+            os.makedirs(path, exist_ok=True)
+            return
+        if truncate or not os.path.exists(path):
+            open(path, "w", encoding="utf-8").close()
         else:
-            yield json.dumps({"type": "log", "message": "チャンネルURLとして処理します。"}) + "\n"
-            channel_id = extract_channel_id(url, api_key, youtube_client=youtube_client)
-            yield json.dumps({"type": "log", "message": "チャンネルID: " + channel_id}) + "\n"
-            uploads_playlist_id = get_uploads_playlist_id(channel_id, api_key, youtube_client=youtube_client)
-            yield json.dumps({"type": "log", "message": "アップロード動画リスト取得中..."}) + "\n"
-            video_list = get_video_list(uploads_playlist_id, api_key, youtube_client=youtube_client)
+            # 中断時に書きかけだった最後の行は、追記するレコードとつながらないよう取り除く
+            partial = False
+            with open(path, "rb") as f:
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    partial = f.read(1) != b"\n"
+            if drop_ids or partial:
+                prune_jsonl(path, set(drop_ids))
+        self._file = open(path, "a", encoding="utf-8")
+
+    def iter_records(self, video_id, subtitles):
+        # subtitles は {言語: キューのリスト or None}
+        for lang, cues in subtitles.items():
+            if not cues:
+                continue
+            units = merge_cue_sentences(cues, lang) if self.mode == "sentences" else cues
+            for start, end, text in units:
+                yield json.dumps({"video_id": video_id, "lang": lang, "start": start, "end": end, "text": text},
+                                 ensure_ascii=False) + "\n"
+
+    def write(self, video_id, subtitles):
+        # 書き出したバイト数を返す
+        size = 0
+        if self.shard:
+            # 読み手が書きかけのファイルを見ないよう、一時ファイルに書いてから置き換える
+            dest = os.path.join(self.path, video_id + ".jsonl")
+            tmp_path = dest + ".tmp"
+            count = 0
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in self.iter_records(video_id, subtitles):
+                    f.write(record)
+                    count += 1
+                    size += len(record.encode("utf-8"))
+            os.replace(tmp_path, dest)
+            with self._lock:
+                self.records_written += count
+            return size
+        with self._lock:
+            for record in self.iter_records(video_id, subtitles):
+                self._file.write(record)
+                self.records_written += 1
+                size += len(record.encode("utf-8"))
+            self._file.flush()
+        return size
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def write_structured_output(structured, video, subtitles, stats=None):
+    # 動画1本分のキューを書き出し、Markdown と検索索引で使う {言語: テキスト} を返す
+    with StageTimer(stats, "jsonl"):
+        size = structured.write(video["video_id"], subtitles)
+    incr_stat(stats, "output_bytes_jsonl", size)
+    return {lang: cues_to_text(cues) for lang, cues in subtitles.items()}
+
+def open_structured_output(config, output_dest, truncate=False, drop_ids=()):
+    mode = config.get("structured_output", "none")
+    if mode not in STRUCTURED_OUTPUT_MODES or mode == "none":
+        return None
+    shard = bool(config.get("structured_output_shard", False))
+    return StructuredOutputWriter(structured_output_path(output_dest, shard), mode=mode, shard=shard,
+                                  truncate=truncate, drop_ids=drop_ids)
+
+# --- ジョブのチェックポイント ---
+# 出力ファイルの隣に <出力先>.manifest.json を置き、ジョブID・動画一覧・動画ごとの状態と
+# 出力内のバイト位置を記録する。中断したジョブはここから完了済みの動画を飛ばして再開できる。
+MANIFEST_SUFFIX = ".manifest.json"
+
+def get_manifest_path(output_dest):
+    return output_dest + MANIFEST_SUFFIX
+
+def load_manifest(output_dest):
+    path = get_manifest_path(output_dest)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_manifest(manifest):
+    path = get_manifest_path(manifest["output"])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def default_languages(config):
+    langs = config.get("subtitle_languages") or DEFAULT_SUBTITLE_LANGUAGES
+    mode = config.get("subtitle_language_mode", "all")
+    return {"languages": list(langs), "mode": mode if mode in LANGUAGE_MODES else "all"}
+
+def parse_language_options(values, config):
+    # /process の languages・language_mode。未指定の項目は設定ファイルの値を使う
+    options = default_languages(config)
+    langs = parse_languages(values.get("languages"))
+    if langs:
+        options["languages"] = langs
+    if values.get("language_mode") in LANGUAGE_MODES:
+        options["mode"] = values.get("language_mode")
+    return options
+
+def find_resumable_manifest(output_dest, url=None, job_id=None, filters=None, languages=None):
+    manifest = load_manifest(output_dest)
+    if not manifest or manifest.get("status") == "completed":
+        return None
+    if job_id is not None and manifest.get("job_id") != job_id:
+        return None
+    if url is not None and manifest.get("url") != url:
+        return None
+    if filters is not None and (manifest.get("filters") or {}) != filters:
+        return None
+    if languages is not None and (manifest.get("languages") or {"languages": DEFAULT_SUBTITLE_LANGUAGES, "mode": "all"}) != languages:
+        return None
+    # 記録済みの位置より出力ファイルが短い場合は整合性が取れないため再開しない
+    try:
+        if os.path.getsize(output_dest) < manifest.get("committed_bytes", 0):
+            return None
+    except OSError:
+        return None
+    return manifest
+
+# --- 出力ファイルの閲覧 ---
+# 数百 MB の出力でもブラウザとサーバーのメモリを圧迫しないよう、/preview は動画セクションの目次だけを返し、
+# 本文は /download への Range リクエストで必要なセクションだけ読む。目次はマニフェストに記録した
+# オフセットから作り、マニフェストがファイル全体を覆っていない場合は mmap で見出し行を走査する。
+SECTION_HEADING_REGEX = re.compile(r"^## \[(.*)\]\(https://www\.youtube\.com/watch\?v=([^)\s]+)\)")
+SECTION_INDEX_CACHE_SIZE = 8
+SECTION_SEPARATOR_SLACK = 2
+PREVIEW_PAGE_SIZE = 200
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_GZIP_LEVEL = 1
+DOWNLOAD_ZSTD_LEVEL = 3
+_section_index_cache = OrderedDict()
+_section_index_lock = threading.Lock()
+
+def manifest_section_index(path, size):
+    # 完了済みセクションがファイルの先頭から末尾まで（区切りの改行を除いて）隙間なく並んでいる場合だけ
+    # マニフェストを使う（差分同期で追記したファイルは、以前の実行分がマニフェストに載っていない）
+    manifest = load_manifest(path)
+    if not manifest or manifest.get("committed_bytes") != size:
+        return None
+    done = sorted((v for v in manifest["videos"] if v.get("status") == "done" and "offset" in v),
+                  key=lambda v: v["offset"])
+    if not done or done[0]["offset"] != 0:
+        return None
+    ends = [v["offset"] for v in done[1:]] + [size]
+    for v, end in zip(done, ends):
+        if not 0 <= end - (v["offset"] + v["length"]) <= SECTION_SEPARATOR_SLACK:
+            return None
+    # セクションの長さは次のセクションの先頭まで（区切りの改行を含む）とし、走査結果と揃える
+    return [{"title": v["title"], "video_id": v["video_id"], "offset": v["offset"], "length": end - v["offset"]}
+            for v, end in zip(done, ends)]
+
+def scan_section_index(path):
+    # 字幕本文は1行にまとめて書き出しているため、行頭の "## [" はセクションの見出しに限られる
+    sections = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return sections
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            starts = [0] if mm[:4] == b"## [" else []
+            pos = mm.find(b"\n## [")
+            while pos != -1:
+                starts.append(pos + 1)
+                pos = mm.find(b"\n## [", pos + 1)
+            for i, start in enumerate(starts):
+                end = starts[i + 1] if i + 1 < len(starts) else size
+                eol = mm.find(b"\n", start, end)
+                heading = mm[start:eol if eol != -1 else end].decode("utf-8", "replace")
+                m = SECTION_HEADING_REGEX.match(heading)
+                sections.append({
+                    "title": m.group(1) if m else heading[3:],
+                    "video_id": m.group(2) if m else None,
+                    "offset": start,
+                    "length": end - start
+                })
+    return sections
+
+def get_section_index(path):
+    st = os.stat(path)
+    key = (st.st_size, st.st_mtime_ns)
+    with _section_index_lock:
+        cached = _section_index_cache.get(path)
+        if cached is not None and cached[0] == key:
+            _section_index_cache.move_to_end(path)
+            return cached[1]
+    sections = manifest_section_index(path, st.st_size)
+    if sections is None:
+        sections = scan_section_index(path)
+    with _section_index_lock:
+        _section_index_cache[path] = (key, sections)
+        while len(_section_index_cache) > SECTION_INDEX_CACHE_SIZE:
+            _section_index_cache.popitem(last=False)
+    return sections
+
+def is_zstd_available():
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def choose_download_encoding(accept_encodings, config, ranged=False):
+    # download_compression が有効で、クライアントが対応している場合だけ圧縮して送る。
+    # Range 付きのリクエストは圧縮後のバイト位置と対応しないため、常にそのまま返す
+    if ranged or not config.get("download_compression", False):
+        return None
+    if accept_encodings.quality("zstd") > 0 and is_zstd_available():
+        return "zstd"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+def iter_compressed_file(path, encoding, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    if encoding == "zstd":
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=DOWNLOAD_ZSTD_LEVEL).compressobj()
+    else:
+        compressor = zlib.compressobj(DOWNLOAD_GZIP_LEVEL, zlib.DEFLATED, 31)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+    yield compressor.flush()
+
+# --- 進捗イベント（SSE） ---
+# ジョブごとに連番付きのイベントを一定数保持し、/events/<ジョブID> で配信する。再接続時は
+# Last-Event-ID より後のイベントから送り直す。動画ごとの進捗は最新の状態だけを残し、
+# 1本あたり最短 SSE_VIDEO_INTERVAL 秒おきにまとめて送る。
+SSE_BUFFER_EVENTS = 5000
+SSE_VIDEO_INTERVAL = 0.25
+SSE_PROGRESS_INTERVAL = 1.0
+SSE_THROUGHPUT_WINDOW = 10.0
+SSE_KEEPALIVE_SECONDS = 15
+VIDEO_FINAL_STAGES = ("done", "skipped")
+
+class JobEventLog:
+    def __init__(self, max_events=SSE_BUFFER_EVENTS, video_interval=SSE_VIDEO_INTERVAL,
+                 progress_interval=SSE_PROGRESS_INTERVAL):
+        self.video_interval = video_interval
+        self.progress_interval = progress_interval
+        self.closed = False
+        self._events = deque(maxlen=max_events)
+        self._next_id = 1
+        self._cond = threading.Condition()
+        self._videos = {}
+        self._pending = {}
+        self._last_sent = {}
+        self._progress = {}
+        self._progress_pending = False
+        self._progress_sent = 0.0
+        self._completions = deque()
+        self._started = time.monotonic()
+
+    def _append(self, name, data):
+        self._events.append((self._next_id, name, data))
+        self._next_id += 1
+        self._cond.notify_all()
+
+    def emit(self, name, data):
+        with self._cond:
+            self._append(name, data)
+
+    def video(self, video_id, progress, stage, title=None):
+        now = time.monotonic()
+        with self._cond:
+            state = self._videos.setdefault(video_id, {"video_id": video_id})
+            if title is not None:
+                state["title"] = title
+            state.update({"stage": stage, "progress": round(progress, 1)})
+            final = stage in VIDEO_FINAL_STAGES
+            if final:
+                del self._videos[video_id]
+                self._completions.append(now)
+            # 段階が変わるたびに送ると動画数に比例して増えるため、間隔内の更新は最後の状態だけを送る
+            if final or now - self._last_sent.get(video_id, 0.0) >= self.video_interval:
+                self._pending.pop(video_id, None)
+                self._send_video(video_id, dict(state), now, final)
+            else:
+                self._pending[video_id] = dict(state)
+
+    def _send_video(self, video_id, state, now, final):
+        self._append("video", state)
+        if final:
+            self._last_sent.pop(video_id, None)
+        else:
+            self._last_sent[video_id] = now
+
+    def progress(self, **fields):
+        # ジョブ全体の進捗。スループット（直近の完了本数/秒）を添えて最短 progress_interval 秒おきに送る
+        with self._cond:
+            self._progress.update(fields)
+            self._progress_pending = True
+            self._flush(time.monotonic())
+
+    def close(self, status):
+        with self._cond:
+            self._flush(time.monotonic(), force=True)
+            self._append("status", {"status": status})
+            self.closed = True
+            self._cond.notify_all()
+
+    def _flush(self, now, force=False):
+        for video_id, state in list(self._pending.items()):
+            if force or now - self._last_sent.get(video_id, 0.0) >= self.video_interval:
+                del self._pending[video_id]
+                self._send_video(video_id, state, now, False)
+        if self._progress_pending and (force or now - self._progress_sent >= self.progress_interval):
+            while self._completions and now - self._completions[0] > SSE_THROUGHPUT_WINDOW:
+                self._completions.popleft()
+            data = dict(self._progress)
+            # 開始直後は経過時間で割り、窓の長さで割って過小に見積もらないようにする
+            rate = len(self._completions) / max(1.0, min(SSE_THROUGHPUT_WINDOW, now - self._started))
+            data["videos_per_second"] = round(rate, 2)
+            if rate and data.get("total") and data.get("done") is not None:
+                data["eta_seconds"] = round(max(0, data["total"] - data["done"]) / rate)
+            self._append("progress", data)
+            self._progress_pending = False
+            self._progress_sent = now
+
+    def snapshot(self):
+        # 取りこぼしたイベントの代わりに送る、現在のジョブ進捗と処理中の動画の一覧
+        with self._cond:
+            return {"progress": dict(self._progress), "videos": list(self._videos.values()), "closed": self.closed}
+
+    def read(self, after_id, timeout):
+        # after_id より後のイベントを返す。無ければ timeout 秒まで待つ。
+        # (イベント, 保持範囲より前を取りこぼしたか, 終了済みか)
+        with self._cond:
+            self._flush(time.monotonic())
+            if not self.closed and (not self._events or self._events[-1][0] <= after_id):
+                self._cond.wait(timeout)
+                self._flush(time.monotonic())
+            events = [event for event in self._events if event[0] > after_id]
+            missed = bool(self._events) and self._events[0][0] > after_id + 1
+            return events, missed, self.closed
+
+# --- ジョブ管理 ---
+# /process ごとにスレッドプールを作る代わりに、プロセス全体で1つのワーカープールと AdaptiveScheduler を
+# 共有する。ジョブの状態はストリームに流れるイベントから更新し、/jobs と /jobs/<ジョブID> で参照できる。
+JOB_HISTORY_LIMIT = 100
+
+class SharedWorkerPool:
+    # ジョブごとのキューをラウンドロビンで回り、後から来たジョブも先行するジョブと交互にワーカーを得る。
+    # 同時に実行するタスク数は limit()（共有 scheduler の現在の上限）に合わせる
+    def __init__(self, workers, limit=None):
+        self.workers = workers
+        self.limit = limit or (lambda: workers)
+        self.running = 0
+        self._idle = 0
+        self._queues = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def submit(self, job_id, func, *args):
+        future = concurrent.futures.Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ワーカープールは終了しています。")
+            self._queues.setdefault(job_id, deque()).append((future, func, args))
+            # 空いているワーカーが無いときだけ、上限までスレッドを増やす
+            if self._idle == 0 and len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+        return future
+
+    def cancel_job(self, job_id):
+        # 未着手のタスクを取り消す（実行中のタスクはそのまま終わらせる）
+        with self._cond:
+            queue = self._queues.pop(job_id, None)
+        for future, _, _ in queue or ():
+            future.cancel()
+
+    def queued(self, job_id=None):
+        # job_id を省略するとすべてのジョブの待ち数の合計
+        with self._cond:
+            if job_id is None:
+                return sum(len(queue) for queue in self._queues.values())
+            return len(self._queues.get(job_id, ()))
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            queues = list(self._queues.values())
+            self._queues.clear()
+            self._cond.notify_all()
+        for queue in queues:
+            for future, _, _ in queue:
+                future.cancel()
+
+    def _next_task(self):
+        with self._cond:
+            self._idle += 1
+            while not self._closed and (not self._queues or self.running >= max(1, self.limit())):
+                # 上限は他のジョブの完了でも変わるため、通知が無くても定期的に確かめる
+                self._cond.wait(timeout=0.5)
+            self._idle -= 1
+            if self._closed:
+                return None
+            job_id, queue = next(iter(self._queues.items()))
+            task = queue.popleft()
+            if queue:
+                self._queues.move_to_end(job_id)
+            else:
+                del self._queues[job_id]
+            self.running += 1
+            return task
+
+    def _run(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            future, func, args = task
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(func(*args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self.running -= 1
+                    self._cond.notify()
+
+class JobManager:
+    def __init__(self):
+        self.jobs = OrderedDict()
+        self.event_logs = {}
+        self.controls = {}
+        self.scheduler = None
+        self.pool = None
+        self._pool_key = None
+        self._lock = threading.Lock()
+
+    def _running(self):
+        return [job for job in self.jobs.values() if job["status"] == "running"]
+
+    def _resources(self, config):
+        # 実行中のジョブが無いときに限り、設定の変更に合わせて共有の scheduler とプールを作り直す
+        key = tuple(config.get(k) for k in ("min_workers", "max_workers", "initial_workers",
+                                             "max_requests_per_second", "throttle_max_retries"))
+        if self.pool is None or (key != self._pool_key and not self._running()):
+            if self.pool is not None:
+                self.pool.shutdown()
+            scheduler = create_scheduler(config)
+            self.scheduler = scheduler
+            self.pool = SharedWorkerPool(scheduler.max_workers, limit=lambda: scheduler.current_limit)
+            self._pool_key = key
+        return self.scheduler, self.pool
+
+    def start(self, job_id, url, output, engine, resumed, config):
+        # ジョブを登録し、(共有の scheduler, 共有の pool, ジョブの JobControl) を返す。
+        # 同じジョブや同じ出力先のジョブが実行中なら ValueError
+        with self._lock:
+            for job in self._running():
+                if job["job_id"] == job_id:
+                    raise ValueError(f"ジョブ {job_id} は既に実行中です。")
+                if job["output"] == output:
+                    raise ValueError(f"出力先 {output} は実行中のジョブ {job['job_id']} が使用しています。")
+            scheduler, pool = self._resources(config)
+            control = create_job_control(config)
+            self.controls[job_id] = control
+            self.jobs.pop(job_id, None)
+            self.event_logs[job_id] = JobEventLog()
+            self.event_logs[job_id].emit("status", {"status": "running"})
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "url": url,
+                "output": output,
+                "engine": engine,
+                "resumed": resumed,
+                "status": "running",
+                "total": None,
+                "estimated": True,
+                "done": 0,
+                "progress": 0,
+                "message": None,
+                "created_at": time.time(),
+                "finished_at": None
+            }
+            finished = [j for j, job in self.jobs.items() if job["status"] != "running"]
+            for old_id in finished[:max(0, len(finished) - JOB_HISTORY_LIMIT)]:
+                del self.jobs[old_id]
+                self.event_logs.pop(old_id, None)
+            return scheduler, pool, control
+
+    def cancel(self, job_id):
+        # 実行中のジョブを取り消す。対象が無ければ False
+        with self._lock:
+            control = self.controls.get(job_id)
+        if control is None:
+            return False
+        control.cancel()
+        return True
+
+    def is_cancelled(self, job_id):
+        with self._lock:
+            control = self.controls.get(job_id)
+        return control is not None and control.cancelled
+
+    def event_log(self, job_id):
+        with self._lock:
+            return self.event_logs.get(job_id)
+
+    def observe(self, job_id, event):
+        # ストリームのイベントからジョブの状態を更新する
+        kind = event.get("type")
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            log = self.event_logs[job_id]
+            if kind == "total":
+                job["total"] = event["total"]
+                job["estimated"] = event["estimated"]
+                log.progress(total=job["total"], estimated=job["estimated"])
+            elif kind == "overall_progress":
+                job["progress"] = event["progress"]
+                job["done"] = event.get("done", job["done"])
+                log.progress(progress=job["progress"], done=job["done"])
+            elif kind == "log":
+                job["message"] = event["message"]
+            elif kind == "confirm":
+                job["preview"] = event["preview"]
+                job["stats"] = event.get("stats")
+                job["api_usage"] = event.get("api_usage")
+
+    def finish(self, job_id, status, error=None):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job["status"] = status
+            job["finished_at"] = time.time()
+            self.controls.pop(job_id, None)
+            METRICS.inc("subtitle_jobs_total", 1, (("status", status),))
+            if error is not None:
+                job["message"] = "エラー: " + error
+            self.event_logs[job_id].close(status)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+        if job["status"] == "running" and self.pool is not None:
+            job["queued"] = self.pool.queued(job_id)
+        return job
+
+    def list(self):
+        with self._lock:
+            job_ids = list(reversed(self.jobs))
+        return [job for job in map(self.get, job_ids) if job is not None]
+
+JOBS = JobManager()
+
+# /metrics の取得時に、共有の scheduler とワーカープールの現在の状態を読む
+METRICS.gauge("subtitle_jobs_running", "実行中のジョブ数",
+              lambda: sum(1 for job in JOBS.list() if job["status"] == "running"))
+METRICS.gauge("subtitle_queue_depth", "共有ワーカープールで実行を待っている動画の数（threads エンジン）",
+              lambda: JOBS.pool.queued() if JOBS.pool is not None else 0)
+METRICS.gauge("subtitle_active_workers", "実行中の yt-dlp 呼び出しの数",
+              lambda: JOBS.scheduler.active if JOBS.scheduler is not None else 0)
+METRICS.gauge("subtitle_concurrency_limit", "適応的な同時実行数の現在の上限",
+              lambda: JOBS.scheduler.current_limit if JOBS.scheduler is not None else 0)
+
+def process_and_stream(url, api_key, output_dest, config=None, resume=None, filters=None, languages=None, jobs=None):
+    # 抽出処理のストリームをそのまま流しつつ、イベントからジョブの状態を更新する
+    jobs = jobs or JOBS
+    job_id = None
+    status = "failed"
+    error = None
+    lines = run_extraction(url, api_key, output_dest, config=config, resume=resume, filters=filters,
+                           languages=languages, jobs=jobs)
+    try:
+        for line in lines:
+            event = json.loads(line)
+            if event["type"] == "job":
+                job_id = event["job_id"]
+            elif job_id is not None:
+                jobs.observe(job_id, event)
+                if event["type"] == "confirm":
+                    status = "completed"
+            yield line
     except Exception as e:
+        error = str(e)
+        raise
+    except BaseException:
+        # クライアントの切断（GeneratorExit）やコマンドラインでの Ctrl+C（KeyboardInterrupt）。
+        # 待機中の動画を取り下げ、別のプロセスグループで動いている yt-dlp も終了させる
+        status = "interrupted"
+        if job_id is not None:
+            jobs.cancel(job_id)
+        raise
+    finally:
+        lines.close()
+        if job_id is not None:
+            if status == "failed" and jobs.is_cancelled(job_id):
+                status = "cancelled"
+            jobs.finish(job_id, status, error=error)
+
+def run_extraction(url, api_key, output_dest, config=None, resume=None, filters=None, languages=None, jobs=None):
+    # languages は {"languages": [...], "mode": "all" | "first"}。省略時は設定ファイルの値を使う
+    if config is None:
+        config = {}
+    if jobs is None:
+        jobs = JOBS
+    if resume:
+        filters = resume.get("filters")
+        languages = resume.get("languages")
+    filters = filters or {}
+    if languages is None:
+        languages = default_languages(config)
+    langs = languages["languages"]
+    first_only = languages["mode"] == "first"
+    backend = config.get("yt_dlp_backend", "subprocess")
+    preference = config.get("subtitle_preference", DEFAULT_SUBTITLE_PREFERENCE)
+    auto_dedup = config.get("auto_caption_dedup", DEFAULT_AUTO_CAPTION_DEDUP)
+    engine = config.get("engine", "threads")
+    enrich = config.get("enrich_videos", True)
+    longest_first = config.get("schedule_longest_first", True)
+    stats = JobStats()
+    usage = ApiUsage()
+    started = time.perf_counter()
+    sync_playlist_id = None
+    sync_entry = None
+    known_ids = None
+    resumed_videos = None
+    yield json.dumps({"type": "log", "message": "URL受信: " + url}) + "\n"
+    youtube_client = get_youtube_client(api_key)
+    if resume:
+        # 再開時はチャンネル解決を省き、チェックポイントの内容から続きを処理する
+        manifest = resume
+        job_id = manifest["job_id"]
+        list_playlist_id = manifest["playlist_id"]
+        if manifest.get("sync"):
+            sync_playlist_id = manifest["sync"]["playlist_id"]
+            sync_entry = manifest["sync"]["previous"]
+            if sync_entry:
+                known_ids = sync_entry["known_ids"]
+        if manifest.get("listing_complete"):
+            resumed_videos = [{"video_id": v["video_id"], "title": v["title"]} for v in manifest["videos"]]
+        done_count = sum(1 for v in manifest["videos"] if v.get("status") == "done")
+        yield json.dumps({"type": "log", "message": f"ジョブ {job_id} を再開します（完了済み {done_count} 本）。"}) + "\n"
+    else:
+        try:
+            playlist_id = extract_playlist_id(url)
+            if playlist_id:
+                yield json.dumps({"type": "log", "message": "プレイリストURL検出。動画リスト取得中..."}) + "\n"
+                list_playlist_id = playlist_id
+            else:
+                yield json.dumps({"type": "log", "message": "チャンネルURLとして処理します。"}) + "\n"
+                with StageTimer(stats, "resolve_channel"):
+                    channel_id, list_playlist_id, cached = resolve_channel(
+                        url, api_key, youtube_client=youtube_client, usage=usage,
+                        use_cache=config.get("channel_cache_enabled", True)
+                    )
+                yield json.dumps({"type": "log", "message": "チャンネルID: " + channel_id + ("（キャッシュ）" if cached else "")}) + "\n"
+                # 絞り込み時の結果は一部の動画だけなので、差分同期の基準にはしない
+                if config.get("incremental_sync", True) and not filters:
+                    sync_playlist_id = list_playlist_id
+                    sync_entry = get_sync_entry(list_playlist_id, output_dest)
+                if sync_entry:
+                    yield json.dumps({"type": "log", "message": "前回の同期以降の新着動画を取得中..."}) + "\n"
+                    known_ids = sync_entry["known_ids"]
+                else:
+                    yield json.dumps({"type": "log", "message": "アップロード動画リスト取得中..."}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "log", "message": "エラー: " + str(e)}) + "\n"
+            return
+        job_id = uuid.uuid4().hex[:12]
+        manifest = {
+            "job_id": job_id,
+            "url": url,
+            "output": output_dest,
+            "playlist_id": list_playlist_id,
+            "sync": {"playlist_id": sync_playlist_id, "previous": sync_entry} if sync_playlist_id else None,
+            "status": "running",
+            "listing_complete": False,
+            "committed_bytes": os.path.getsize(output_dest) if sync_entry else 0,
+            "videos": [],
+            "filters": filters,
+            "languages": languages,
+            "created_at": time.time()
+        }
+    try:
+        scheduler, pool, control = jobs.start(job_id, url=url, output=output_dest, engine=engine,
+                                              resumed=bool(resume), config=config)
+    except ValueError as e:
         yield json.dumps({"type": "log", "message": "エラー: " + str(e)}) + "\n"
         return
+    events = jobs.event_log(job_id)
+    yield json.dumps({"type": "job", "job_id": job_id, "resumed": bool(resume)}) + "\n"
+    if filters:
+        yield json.dumps({"type": "log", "message": "絞り込み条件: " + json.dumps(filters, ensure_ascii=False)}) + "\n"
+    if langs != DEFAULT_SUBTITLE_LANGUAGES:
+        yield json.dumps({"type": "log", "message": (
+            "字幕の言語: " + ", ".join(langs) + ("（最初に見つかった言語のみ）" if first_only and len(langs) > 1 else "")
+        )}) + "\n"
+    since = parse_publish_time(filters["since"]) if "since" in filters else None
+    until = parse_publish_time(filters["until"]) if "until" in filters else None
+    # アップロード再生リスト（UU...）は新しい順に並ぶため、since より古い動画に達したら一覧取得を止められる
+    chronological = list_playlist_id.startswith("UU")
+    exclusions = filters.get("exclude_shorts") or filters.get("exclude_live")
 
-    total = len(video_list)
-    yield json.dumps({"type": "log", "message": f"{total} 本の動画が見つかりました。"}) + "\n"
-    finished_count = 0
-    results = [None] * total
+    # 再開時は最後にチェックポイントへ記録した位置より後ろ（書きかけの部分）を切り詰める
+    previous_entries = {v["video_id"]: v for v in manifest["videos"]}
+    with open(output_dest, "a", encoding="utf-8"):
+        pass
+    with open(output_dest, "r+b") as f:
+        f.truncate(manifest["committed_bytes"])
+    manifest["videos"] = []
+    save_manifest(manifest)
+
+    def on_flush(sections, position):
+        for list_idx, offset, length in sections:
+            entry = manifest["videos"][list_idx]
+            entry.update({"status": "done", "offset": offset, "length": length})
+        manifest["committed_bytes"] = position
+        manifest["updated_at"] = time.time()
+        save_manifest(manifest)
+
+    max_workers = scheduler.max_workers
+    # 一覧取得スレッドが動画を順次キューに積み、取得完了を待たずにワーカーへ投入する。
+    # キューと投入済みタスク数に上限を設け、一覧取得が処理より先行しすぎないようにする。
+    video_queue = Queue(maxsize=max_workers * 4)
+    listing = {"estimate": None, "error": None, "accepted": 0}
     log_queue = Queue()
 
+    def on_page(total_results):
+        if listing["estimate"] is None and total_results is not None:
+            listing["estimate"] = total_results
+            log_queue.put(json.dumps({"type": "total", "total": total_results, "estimated": True}) + "\n")
+            log_queue.put(json.dumps({"type": "log", "message": f"約 {total_results} 本の動画が見つかりました（一覧取得中）。"}) + "\n")
+
+    def put_video(video):
+        # ジョブが取り消されたら、キューの空き待ちをやめて一覧取得を終える
+        while not control.cancelled:
+            try:
+                video_queue.put(video, timeout=0.5)
+                return True
+            except Full:
+                pass
+        return False
+
+    def list_videos():
+        try:
+            page_token = None
+            while True:
+                videos, page_token, total_results = list_page(page_token)
+                on_page(total_results)
+                for video in videos:
+                    if not put_video(video):
+                        return
+                if not page_token:
+                    break
+        except Exception as e:
+            listing["error"] = e
+        finally:
+            put_video(None)
+
+    def list_page(page_token):
+        if resumed_videos is not None:
+            # 再開時もページと同じ 50 本単位で動画情報を付け直す
+            start = int(page_token or 0)
+            videos = [dict(v) for v in resumed_videos[start:start + 50]]
+            page_token = str(start + 50) if start + 50 < len(resumed_videos) else None
+            total_results = None
+        else:
+            videos, page_token, total_results = fetch_video_page(
+                list_playlist_id, youtube_client, page_token, set(known_ids or ()),
+                usage=usage, page_cache=page_cache, since=since, until=until, chronological=chronological
+            )
+            # 絞り込み時や差分同期（既知の動画で打ち切る）の totalResults は処理対象の本数と一致しないため推定値に使わない
+            if since or until or exclusions or known_ids:
+                total_results = None
+            elif "limit" in filters and total_results is not None:
+                total_results = min(total_results, filters["limit"])
+        if (enrich or exclusions) and videos:
+            enrich_videos(videos, youtube_client, usage=usage)
+        if resumed_videos is None:
+            if exclusions:
+                shorts_max_seconds = config.get("shorts_max_seconds", SHORTS_MAX_SECONDS)
+                videos = [v for v in videos if not is_excluded_video(v, filters, shorts_max_seconds)]
+            if "limit" in filters:
+                remaining = filters["limit"] - listing["accepted"]
+                if len(videos) >= remaining:
+                    videos = videos[:remaining]
+                    page_token = None
+                listing["accepted"] += len(videos)
+        return videos, page_token, total_results
+
+    def dispatch_priority(video, idx):
+        # 長い動画から先に始め、最後に長い動画だけが残って待たされるのを避ける。
+        # 一覧順に書き出す場合は max_workers 本ずつの区切りの中だけで並べ替え、先頭の書き出しを遅らせない
+        if not longest_first:
+            return (0, 0)
+        block = idx // max_workers if ordered else 0
+        return (block, -(video.get("duration") or 0))
+
     def worker(video, idx):
         log_queue.put(json.dumps({"type": "log", "message": f"開始: {video['title']}"} ) + "\n")
-        res = process_video(video, progress_callback=lambda vid, prog: None)
+        events.video(video["video_id"], 0.0, "started", title=video["title"])
+        res = process_video(video, progress_callback=events.video,
+                            backend=backend, preference=preference, stats=stats, cache=cache,
+                            scheduler=scheduler, languages=langs, first_only=first_only, control=control,
+                            search_index=search_index, structured=structured, auto_dedup=auto_dedup)
         log_queue.put(json.dumps({"type": "log", "message": f"完了: {video['title']}"} ) + "\n")
         return idx, res
 
-    max_workers = (os.cpu_count() or 4) * 2
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(worker, video, idx): idx for idx, video in enumerate(video_list)}
-        while futures:
-            done, _ = concurrent.futures.wait(futures, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
-            for future in list(done):
-                idx, res = future.result()
-                results[idx] = res
-                finished_count += 1
-                overall = int((finished_count / total) * 100)
-                yield json.dumps({"type": "overall_progress", "progress": overall}) + "\n"
-                del futures[future]
-            try:
-                while True:
-                    msg = log_queue.get_nowait()
+    def drain_logs():
+        msgs = []
+        try:
+            while True:
+                msgs.append(log_queue.get_nowait())
+        except Empty:
+            pass
+        return msgs
+
+    def register_video(video):
+        # マニフェストに登録し、前回までに書き出し済みなら False を返す
+        video_list.append(video)
+        entry = previous_entries.get(video["video_id"])
+        if entry is None or entry.get("status") != "done":
+            entry = {"video_id": video["video_id"], "title": video["title"], "status": "pending"}
+        manifest["videos"].append(entry)
+        return entry["status"] != "done"
+
+    def finish_listing():
+        # 一覧取得スレッドが積んだ推定総数などを先に出し、確定した総数より後にならないようにする
+        for msg in drain_logs():
+            yield msg
+        manifest["listing_complete"] = listing["error"] is None
+        save_manifest(manifest)
+        total = len(video_list)
+        yield json.dumps({"type": "total", "total": total, "estimated": False}) + "\n"
+        yield json.dumps({"type": "log", "message": f"{total} 本の動画が見つかりました。"}) + "\n"
+
+    def overall_progress():
+        # 一覧取得中は推定総数で進捗を出し、100% には達しないようにする
+        if listing_done:
+            return int((finished_count / len(video_list)) * 100)
+        estimate = max(listing["estimate"] or 0, len(video_list) + 1)
+        return min(99, int((finished_count / estimate) * 100))
+
+    video_list = []
+    finished_count = 0
+    write_idx = 0
+    listing_done = False
+    completed = False
+    last_limit = None
+    ordered = config.get("output_order", "playlist") != "completion"
+    writer = MarkdownStreamWriter(output_dest, append=True, ordered=ordered, on_flush=on_flush, stats=stats)
+    cache = open_subtitle_cache(config)
+    page_cache = open_api_page_cache(config)
+    search_index = open_search_index(config)
+    # 前回のチェックポイントまでに書き出していない動画のレコードは、再処理で重複しないよう取り除く
+    structured = open_structured_output(
+        config, output_dest, truncate=manifest["committed_bytes"] == 0,
+        drop_ids=[vid for vid, v in previous_entries.items() if v.get("status") != "done"]
+    )
+    if engine == "asyncio":
+        pipeline = AsyncioPipeline(
+            list_page,
+            lambda video, slots: process_video_async(video, slots, backend=backend, preference=preference,
+                                                     stats=stats, cache=cache, scheduler=scheduler,
+                                                     languages=langs, first_only=first_only,
+                                                     progress_callback=events.video, control=control,
+                                                     search_index=search_index, structured=structured,
+                                                     auto_dedup=auto_dedup),
+            workers=max_workers, window=max_workers * 4
+        )
+        control.on_cancel(lambda: pipeline.events.put(("cancelled", None)))
+        pipeline.start()
+        try:
+            for kind, value in pipeline:
+                if kind == "page":
+                    on_page(value)
+                elif kind == "video":
+                    if register_video(value):
+                        events.video(value["video_id"], 0.0, "started", title=value["title"])
+                        pipeline.submit(write_idx, len(video_list) - 1, value,
+                                        priority=dispatch_priority(value, write_idx))
+                        write_idx += 1
+                    else:
+                        finished_count += 1
+                        pipeline.release_window()
+                elif kind == "listing_error":
+                    listing["error"] = value
+                elif kind == "listing_done":
+                    listing_done = True
+                    yield from finish_listing()
+                    pipeline.finish()
+                elif kind == "log":
+                    log_queue.put(value)
+                elif kind == "result":
+                    idx, list_idx, res = value
+                    if control.cancelled:
+                        # 取り消しで中断された取得の結果は書き出さず、再開時に処理し直す
+                        continue
+                    # 書き出されたセクションの分だけ一覧取得の枠を戻す
+                    pending = len(writer.pending)
+                    writer.add(idx, res, key=list_idx)
+                    pipeline.release_window(1 + pending - len(writer.pending))
+                    finished_count += 1
+                    yield json.dumps({"type": "overall_progress", "progress": overall_progress(),
+                                      "done": finished_count}) + "\n"
+                elif kind == "cancelled":
+                    break
+                elif kind == "error":
+                    if control.cancelled:
+                        break
+                    raise value
+                if scheduler.current_limit != last_limit:
+                    last_limit = scheduler.current_limit
+                    yield json.dumps({"type": "concurrency", "limit": last_limit, "active": scheduler.active}) + "\n"
+                for msg in drain_logs():
                     yield msg
-            except Empty:
-                pass
+            completed = listing_done and listing["error"] is None and not control.cancelled
+        finally:
+            pipeline.close()
+            writer.close(discard_pending=not completed)
+            if cache is not None:
+                cache.close()
+            if page_cache is not None:
+                page_cache.close()
+            if search_index is not None:
+                search_index.close()
+            if structured is not None:
+                structured.close()
+    else:
+        threading.Thread(target=list_videos, daemon=True).start()
+        try:
+            # 動画の処理はプロセス全体で共有するワーカープールに投入する
+            futures = {}
+            ready = []
+            while (not listing_done or futures or ready) and not control.cancelled:
+                # 並べ替え待ちのセクションも上限に含め、先頭の動画が遅い場合のメモリ増加を抑える
+                while not listing_done and len(futures) + len(ready) + len(writer.pending) < max_workers * 4:
+                    try:
+                        video = video_queue.get(timeout=0 if futures else 0.1)
+                    except Empty:
+                        break
+                    if video is None:
+                        listing_done = True
+                        yield from finish_listing()
+                        break
+                    if not register_video(video):
+                        finished_count += 1
+                        continue
+                    heapq.heappush(ready, (dispatch_priority(video, write_idx), write_idx, len(video_list) - 1, video))
+                    write_idx += 1
+                # 同時実行数の上限に空きがある分だけ、優先度の高い動画から投入する。
+                # 上限を超えて投入するとスレッドが scheduler の空き待ちで順不同に並び、優先度が効かなくなる
+                while ready and len(futures) < scheduler.current_limit:
+                    _, idx, list_idx, video = heapq.heappop(ready)
+                    futures[pool.submit(job_id, worker, video, idx)] = list_idx
+                if futures:
+                    done, _ = concurrent.futures.wait(futures, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in list(done):
+                        try:
+                            idx, res = future.result()
+                        except JobCancelledError:
+                            del futures[future]
+                            continue
+                        if control.cancelled:
+                            # 取り消しで中断された取得の結果は書き出さず、再開時に処理し直す
+                            del futures[future]
+                            continue
+                        writer.add(idx, res, key=futures[future])
+                        finished_count += 1
+                        yield json.dumps({"type": "overall_progress", "progress": overall_progress(),
+                                          "done": finished_count}) + "\n"
+                        del futures[future]
+                if scheduler.current_limit != last_limit:
+                    last_limit = scheduler.current_limit
+                    yield json.dumps({"type": "concurrency", "limit": last_limit, "active": scheduler.active}) + "\n"
+                for msg in drain_logs():
+                    yield msg
+            completed = listing["error"] is None and not control.cancelled
+        finally:
+            pool.cancel_job(job_id)
+            writer.close(discard_pending=not completed)
+            if cache is not None:
+                cache.close()
+            if page_cache is not None:
+                page_cache.close()
+            if search_index is not None:
+                search_index.close()
+            if structured is not None:
+                structured.close()
+    for msg in drain_logs():
+        yield msg
+    if control.cancelled:
+        yield json.dumps({"type": "log", "message": f"ジョブ {job_id} を中止しました。/resume?job={job_id} で続きから再開できます。"}) + "\n"
+        return
+    if listing["error"] is not None:
+        yield json.dumps({"type": "log", "message": "エラー: " + str(listing["error"])}) + "\n"
+        yield json.dumps({"type": "log", "message": f"ジョブ {job_id} は /resume?job={job_id} で再開できます。"}) + "\n"
+        return
+    manifest["status"] = "completed"
+    save_manifest(manifest)
+    total = len(video_list)
+    if cache is not None:
+        yield json.dumps({
+            "type": "cache",
+            "hits": stats.get("cache_hits", 0),
+            "misses": stats.get("cache_misses", 0)
+        }) + "\n"
+        yield json.dumps({"type": "log", "message": (
+            f"キャッシュ: ヒット {stats.get('cache_hits', 0)} 件 / ミス {stats.get('cache_misses', 0)} 件"
+        )}) + "\n"
 
-    markdown = "\n".join(results)
-    with open(output_dest, "w", encoding="utf-8") as f:
-        f.write(markdown)
-    yield json.dumps({"type": "log", "message": "全動画の処理完了。Markdownファイル生成。"}) + "\n"
+    if sync_entry:
+        # 差分同期では既存の Markdown の末尾に新着分だけを追記している
+        yield json.dumps({"type": "log", "message": f"新着 {total} 本を既存のMarkdownファイルに追記しました。"}) + "\n"
+    else:
+        yield json.dumps({"type": "log", "message": "全動画の処理完了。Markdownファイル生成。"}) + "\n"
+    if sync_playlist_id:
+        update_sync_entry(sync_playlist_id, output_dest, [v["video_id"] for v in video_list], previous=sync_entry)
+    yield json.dumps({"type": "log", "message": (
+        f"手動字幕: {stats.get('track_manual', 0)} 本 / 自動字幕: {stats.get('track_auto', 0)} 本 / "
+        f"yt-dlp の再実行を回避: {stats.get('second_invocations_avoided', 0)} 回 / "
+        f"字幕なしのためスキップ: {stats.get('skipped_no_captions', 0)} 本"
+    )}) + "\n"
+    yield json.dumps({"type": "log", "message": (
+        f"同時実行数: 最終 {scheduler.current_limit} / レート制限（429）検出: {stats.get('throttled', 0)} 回"
+    )}) + "\n"
+    api_usage = usage.as_dict()
+    yield json.dumps(dict({"type": "api_usage"}, **api_usage)) + "\n"
+    # 処理段階ごとの所要時間。並行して動くため、合計はジョブの経過時間を超えることがある
+    timings = stats.timing_summary()
+    if api_usage["requests"]:
+        timings["api"] = {"count": api_usage["requests"], "total_seconds": api_usage["seconds"],
+                          "mean_seconds": round(api_usage["seconds"] / api_usage["requests"], 4)}
+    elapsed = round(time.perf_counter() - started, 3)
+    yield json.dumps({"type": "log", "message": (
+        f"Data API: クォータ {api_usage['units']} ユニット / リクエスト {api_usage['requests']} 回 / "
+        f"受信 {api_usage['bytes'] / 1024:.1f} KiB / 未変更（304）{api_usage['not_modified']} ページ"
+    )}) + "\n"
     # 出力先パスは confirm メッセージ内でのみ通知
     yield json.dumps({
         "type": "confirm",
         "message": "内容確認",
         "preview": "/preview?file=" + output_dest,
-        "output": output_dest
+        "output": output_dest,
+        "structured_output": structured.path if structured is not None else None,
+        "job_id": job_id,
+        "stats": stats,
+        "api_usage": api_usage,
+        "timings": timings,
+        "elapsed_seconds": elapsed
     }) + "\n"
     HISTORY.append({
         "url": url,
@@ -643,34 +3933,170 @@ def process_and_stream(url, api_key, output_dest):
 
 @app.route("/", methods=["GET"])
 def index():
+    from flask import render_template_string
     return render_template_string(HTML_TEMPLATE)
 
 @app.route("/process", methods=["POST"])
 def process():
+    from flask import request, Response
     url = request.form.get("url")
     if not url:
         return Response(json.dumps({"type": "log", "message": "URLが入力されていません。"}), mimetype='application/json')
-    api_key = keyring.get_password("subtitle_app", "api_key")
+    api_key = get_api_key()
     if not api_key:
         return Response(json.dumps({"type": "log", "message": "API Keyが設定されていません。設定画面から入力してください。"}), mimetype='application/json')
     config = load_config()
+    try:
+        filters = parse_video_filters(request.form)
+        languages = parse_language_options(request.form, config)
+    except ValueError as e:
+        return Response(json.dumps({"type": "log", "message": str(e)}), mimetype='application/json')
     default_dest = os.path.join(os.path.expanduser("~"), "Downloads", "subtitles.md")
     output_dest = config.get("output_dest", default_dest)
-    return Response(process_and_stream(url, api_key, output_dest), mimetype='text/plain')
+    # 同じURL・出力先・絞り込み条件で中断したジョブがあれば自動的に続きから再開する
+    resume = None
+    if config.get("auto_resume", True):
+        resume = find_resumable_manifest(output_dest, url=url, filters=filters, languages=languages)
+    return Response(process_and_stream(url, api_key, output_dest, config=config, resume=resume, filters=filters,
+                                       languages=languages),
+                    mimetype='text/plain')
+
+@app.route("/resume", methods=["GET", "POST"])
+def resume_job():
+    from flask import request, Response
+    job_id = request.values.get("job")
+    if not job_id:
+        return Response(json.dumps({"type": "log", "message": "ジョブIDが指定されていません。"}), mimetype='application/json')
+    api_key = get_api_key()
+    if not api_key:
+        return Response(json.dumps({"type": "log", "message": "API Keyが設定されていません。設定画面から入力してください。"}), mimetype='application/json')
+    config = load_config()
+    default_dest = os.path.join(os.path.expanduser("~"), "Downloads", "subtitles.md")
+    output_dest = request.values.get("file", config.get("output_dest", default_dest))
+    manifest = find_resumable_manifest(output_dest, job_id=job_id)
+    if manifest is None:
+        return Response(json.dumps({"type": "log", "message": "再開できるジョブが見つかりません。"}), mimetype='application/json'), 404
+    return Response(process_and_stream(manifest["url"], api_key, output_dest, config=config, resume=manifest), mimetype='text/plain')
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    from flask import Response
+    return Response(METRICS.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/search", methods=["GET"])
+def search():
+    from flask import request, jsonify
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"message": "検索語を指定してください。"}), 400
+    try:
+        limit = min(max(1, int(request.args.get("limit", SEARCH_RESULT_LIMIT))), SEARCH_RESULT_LIMIT * 10)
+    except ValueError:
+        return jsonify({"message": "limit は整数で指定してください。"}), 400
+    config = load_config()
+    started = time.perf_counter()
+    try:
+        results = search_transcripts(query, path=config.get("search_index_path", SEARCH_INDEX_PATH), limit=limit,
+                                     lang=request.args.get("lang"), channel=request.args.get("channel"))
+    except sqlite3.Error as e:
+        return jsonify({"message": "検索に失敗しました: " + str(e)}), 500
+    return jsonify({"query": query, "results": results,
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+@app.route("/jobs", methods=["GET"])
+def list_jobs():
+    from flask import jsonify
+    return jsonify({"jobs": JOBS.list()})
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    from flask import jsonify
+    if not JOBS.cancel(job_id):
+        return jsonify({"message": "実行中のジョブが見つかりません。"}), 404
+    return jsonify({"message": f"ジョブ {job_id} の中止を要求しました。"})
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    from flask import jsonify
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"message": "ジョブが見つかりません。"}), 404
+    return jsonify(job)
+
+def format_sse(name, data, event_id=None):
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {name}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+def stream_job_events(log, last_id=0):
+    yield "retry: 2000\n\n"
+    last_write = time.monotonic()
+    while True:
+        events, missed, closed = log.read(last_id, timeout=1.0)
+        if missed:
+            # 保持範囲より前から再接続した場合は、取りこぼした分の代わりに現在の状態を送る
+            yield format_sse("snapshot", log.snapshot())
+        for event_id, name, data in events:
+            yield format_sse(name, data, event_id)
+            last_id = event_id
+        if events or missed:
+            last_write = time.monotonic()
+        if closed and not events:
+            return
+        if time.monotonic() - last_write >= SSE_KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_write = time.monotonic()
+
+@app.route("/events/<job_id>", methods=["GET"])
+def job_events(job_id):
+    from flask import request, Response, jsonify
+    log = JOBS.event_log(job_id)
+    if log is None:
+        return jsonify({"message": "ジョブが見つかりません。"}), 404
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or 0)
+    except ValueError:
+        last_id = 0
+    return Response(stream_job_events(log, last_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/download", methods=["GET"])
 def download():
+    from flask import request, Response, send_file
     file = request.args.get("file", os.path.join(os.path.expanduser("~"), "Downloads", "subtitles.md"))
-    if os.path.exists(file):
-        return send_file(file, as_attachment=True)
-    return "ファイルが見つかりません。", 404
+    if not os.path.exists(file):
+        return "ファイルが見つかりません。", 404
+    encoding = choose_download_encoding(request.accept_encodings, load_config(), ranged="Range" in request.headers)
+    if encoding is None:
+        # Range 付きのリクエストには send_file が 206 Partial Content で応える
+        return send_file(file, as_attachment=True, conditional=True)
+    return Response(iter_compressed_file(file, encoding), mimetype="text/markdown", headers={
+        "Content-Encoding": encoding,
+        "Content-Disposition": "attachment; filename*=UTF-8''" + urllib.parse.quote(os.path.basename(file)),
+        "Vary": "Accept-Encoding"
+    })
+
+@app.route("/preview/sections", methods=["GET"])
+def preview_sections():
+    from flask import request, jsonify
+    file = request.args.get("file", os.path.join(os.path.expanduser("~"), "Downloads", "subtitles.md"))
+    if not os.path.exists(file):
+        return jsonify({"message": "ファイルが見つかりません。"}), 404
+    try:
+        start = max(0, int(request.args.get("start", 0)))
+        limit = min(max(1, int(request.args.get("limit", PREVIEW_PAGE_SIZE))), PREVIEW_PAGE_SIZE * 5)
+    except ValueError:
+        return jsonify({"message": "start / limit は整数で指定してください。"}), 400
+    sections = get_section_index(file)
+    return jsonify({"total": len(sections), "start": start, "sections": sections[start:start + limit]})
 
 @app.route("/preview", methods=["GET"])
 def preview():
+    from flask import request, render_template_string
     file = request.args.get("file", os.path.join(os.path.expanduser("~"), "Downloads", "subtitles.md"))
     if os.path.exists(file):
-        with open(file, "r", encoding="utf-8") as f:
-            content = f.read()
+        # 本文は読み込まず、目次と各セクションを必要になった時点で取得するページを返す
         preview_template = """
         <!doctype html>
         <html lang="ja">
@@ -695,6 +4121,9 @@ def preview():
                 max-width: 800px;
                 margin: auto;
               }
+              summary {
+                cursor: pointer;
+              }
               pre {
                 white-space: pre-wrap;
                 word-break: break-all;
@@ -703,29 +4132,70 @@ def preview():
           </head>
           <body>
             <div class="card">
-              <div class="card-header">
-                ファイルプレビュー
+              <div class="card-header d-flex justify-content-between align-items-center">
+                <span>ファイルプレビュー <small id="sectionCount" class="text-muted"></small></span>
+                <a class="btn btn-sm btn-outline-primary" href="{{ download_url }}">ダウンロード</a>
               </div>
               <div class="card-body">
-                <pre>{{ content }}</pre>
+                <div id="sections"></div>
+                <button id="moreBtn" type="button" class="btn btn-outline-secondary btn-sm mt-2 d-none">さらに表示</button>
               </div>
             </div>
+            <script>
+              const file = {{ file|tojson }};
+              const downloadUrl = {{ download_url|tojson }};
+              let next = 0;
+
+              // セクションを開いたときに、その範囲だけを Range リクエストで読み込む
+              function addSection(section) {
+                const details = document.createElement('details');
+                const summary = document.createElement('summary');
+                summary.textContent = section.title;
+                const pre = document.createElement('pre');
+                details.append(summary, pre);
+                details.addEventListener('toggle', () => {
+                  if (!details.open || details.dataset.loaded) return;
+                  details.dataset.loaded = '1';
+                  pre.textContent = '読み込み中...';
+                  fetch(downloadUrl, { headers: { Range: `bytes=${section.offset}-${section.offset + section.length - 1}` } })
+                    .then(response => response.text())
+                    .then(text => { pre.textContent = text; });
+                });
+                document.getElementById('sections').appendChild(details);
+              }
+
+              function loadMore() {
+                fetch('/preview/sections?file=' + encodeURIComponent(file) + '&start=' + next)
+                  .then(response => response.json())
+                  .then(data => {
+                    data.sections.forEach(addSection);
+                    next = data.start + data.sections.length;
+                    document.getElementById('sectionCount').textContent = `（${data.total} 本）`;
+                    document.getElementById('moreBtn').classList.toggle('d-none', next >= data.total);
+                  });
+              }
+              document.getElementById('moreBtn').addEventListener('click', loadMore);
+              loadMore();
+            </script>
           </body>
         </html>
         """
-        return render_template_string(preview_template, content=content)
+        return render_template_string(preview_template, file=file,
+                                      download_url="/download?file=" + urllib.parse.quote(file))
     return "ファイルが見つかりません。", 404
 
 @app.route("/save_config", methods=["POST"])
 def save_config_route():
+    from flask import request, jsonify
     new_api_key = request.form.get("api_key")
     output_dest = request.form.get("output_dest")
     port = request.form.get("port")
     auto_open_browser = request.form.get("auto_open_browser")
+    yt_dlp_backend = request.form.get("yt_dlp_backend")
     config = load_config()
     msg = ""
     if new_api_key:
-        keyring.set_password("subtitle_app", "api_key", new_api_key)
+        set_api_key(new_api_key)
         msg += "API Keyを保存しました。"
     else:
         msg += "API Keyは既に設定済みです。"
@@ -736,6 +4206,8 @@ def save_config_route():
         config["port"] = port
         msg += " ポート番号も保存しました。"
     config["auto_open_browser"] = True if auto_open_browser == "on" else False
+    if yt_dlp_backend in YT_DLP_BACKENDS:
+        config["yt_dlp_backend"] = yt_dlp_backend
     # ※通知音に関する設定は削除しました
     msg += " 設定を保存しました。"
     save_config_to_file(config)
@@ -743,8 +4215,9 @@ def save_config_route():
 
 @app.route("/get_config", methods=["GET"])
 def get_config_route():
+    from flask import jsonify
     config = load_config()
-    api_key = keyring.get_password("subtitle_app", "api_key")
+    api_key = get_api_key()
     default_dest = os.path.join(os.path.expanduser("~"), "Downloads", "subtitles.md")
     port = config.get("port", "5000")
     auto_open_browser = config.get("auto_open_browser", False)
@@ -752,11 +4225,13 @@ def get_config_route():
         "api_key_set": bool(api_key),
         "output_dest": config.get("output_dest", default_dest),
         "port": port,
-        "auto_open_browser": auto_open_browser
+        "auto_open_browser": auto_open_browser,
+        "yt_dlp_backend": config.get("yt_dlp_backend", "subprocess")
     })
 
 @app.route("/choose_output", methods=["GET"])
 def choose_output():
+    from flask import jsonify
     folder = choose_output_folder()
     if folder:
         return jsonify({"output_dest": os.path.join(folder, "subtitles.md")})
@@ -765,17 +4240,19 @@ def choose_output():
 
 @app.route("/get_history", methods=["GET"])
 def get_history():
+    from flask import jsonify
     return jsonify({"history": HISTORY})
 
 @app.route("/shutdown", methods=["GET"])
 def shutdown():
+    from flask import request
     shutdown_func = request.environ.get('werkzeug.server.shutdown')
     if shutdown_func is None:
         return "サーバー終了に失敗しました。", 500
     shutdown_func()
     return "サーバーを終了しました。"
 
-if __name__ == "__main__":
+def run_server():
     config = load_config()
     port = int(config.get("port", 5000))
     host = "127.0.0.1"
@@ -801,3 +4278,210 @@ if __name__ == "__main__":
 
     app.run(host=host, port=port, debug=True, use_reloader=False)
 
+# --- コマンドライン（バッチ実行） ---
+# python -m youtube_subtitle_extractor <URL>... でサーバーを起動せずに抽出する。進捗は標準エラー出力に、
+# 出力ファイルのパス（--stdout の場合は Markdown 本文）は標準出力に書く。引数なしの場合はサーバーを起動する。
+CLI_PROGRESS_INTERVAL = 1.0
+
+def read_url_list(path):
+    # 1行1URL。空行と # で始まる行は飛ばす。"-" は標準入力
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def cli_output_name(url):
+    # 複数の URL を処理する場合の出力ファイル名（プレイリストID・動画ID・チャンネルのパスから作る）
+    parsed = urllib.parse.urlparse(url)
+    query = urllib.parse.parse_qs(parsed.query)
+    name = (query.get("list") or query.get("v") or [None])[0] or parsed.path.strip("/").replace("/", "_")
+    name = re.sub(r"[^\w@.-]+", "_", name or "").strip("._")
+    return (name or hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]) + ".md"
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m youtube_subtitle_extractor",
+        description="YouTube の動画・プレイリスト・チャンネルの字幕を Markdown に抽出します。"
+                    "URL を指定しない場合はウェブサーバーを起動します。"
+    )
+    parser.add_argument("urls", nargs="*", metavar="URL", help="動画・プレイリスト・チャンネルの URL")
+    parser.add_argument("-i", "--input", metavar="FILE", help="URL の一覧ファイル（1行1URL、- で標準入力）")
+    parser.add_argument("-o", "--output", metavar="PATH",
+                        help="出力先。URL が1つなら Markdown のパス、複数ならディレクトリ（既定: 設定の output_dest / カレントディレクトリ）")
+    parser.add_argument("--stdout", action="store_true", help="Markdown の本文を標準出力に書き出す")
+    parser.add_argument("--api-key", help="YouTube Data API のキー（既定: 環境変数 YOUTUBE_API_KEY、なければ保存済みのキー）")
+    parser.add_argument("--languages", help="字幕の言語コード（例: ja,en）")
+    parser.add_argument("--language-mode", choices=LANGUAGE_MODES, help="all: すべての言語 / first: 最初に見つかった言語のみ")
+    parser.add_argument("--since", help="この日以降に公開された動画のみ（例: 2024-01-31）")
+    parser.add_argument("--until", help="この日までに公開された動画のみ")
+    parser.add_argument("--limit", help="最大本数")
+    parser.add_argument("--exclude-shorts", action="store_true", help="ショートを除く")
+    parser.add_argument("--exclude-live", action="store_true", help="ライブ配信を除く")
+    parser.add_argument("--engine", choices=ENGINES, help="抽出処理の実行方式")
+    parser.add_argument("--structured-output", choices=STRUCTURED_OUTPUT_MODES, help="タイムスタンプ付き JSONL の出力")
+    parser.add_argument("--no-resume", action="store_true", help="中断したジョブがあっても最初から処理する")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="設定ファイルの項目を上書きする（値は JSON として解釈し、失敗したら文字列）")
+    parser.add_argument("--ndjson", action="store_true", help="進捗イベントを NDJSON のまま標準エラー出力に書く")
+    parser.add_argument("-v", "--verbose", action="store_true", help="動画ごとの開始・完了も表示する")
+    parser.add_argument("-q", "--quiet", action="store_true", help="エラーと結果以外を表示しない")
+    return parser
+
+def apply_config_overrides(config, args):
+    for item in args.set:
+        key, sep, value = item.partition("=")
+        if not sep or not key:
+            raise ValueError(f"--set は KEY=VALUE の形式で指定してください: {item}")
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    if args.engine:
+        config["engine"] = args.engine
+    if args.structured_output:
+        config["structured_output"] = args.structured_output
+    return config
+
+class CliProgress:
+    # process_and_stream のイベントを標準エラー出力に表示する。端末では進捗を1行で上書きする
+    def __init__(self, stream=None, ndjson=False, verbose=False, quiet=False):
+        self.stream = stream or sys.stderr
+        self.ndjson = ndjson
+        self.verbose = verbose
+        self.quiet = quiet
+        self.tty = self.stream.isatty()
+        self.total = None
+        self.completed = False
+        self._last_progress = 0.0
+        self._progress_shown = False
+
+    def _print(self, message):
+        if self._progress_shown:
+            self.stream.write("\n")
+            self._progress_shown = False
+        self.stream.write(message + "\n")
+        self.stream.flush()
+
+    def event(self, line):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        kind = event.get("type")
+        if kind == "confirm":
+            self.completed = True
+        if self.ndjson:
+            self.stream.write(line if line.endswith("\n") else line + "\n")
+            self.stream.flush()
+            return
+        if kind == "log":
+            message = event.get("message", "")
+            if message.startswith("エラー"):
+                self._print(message)
+            elif not self.quiet and (self.verbose or not message.startswith(("開始: ", "完了: "))):
+                self._print(message)
+        elif kind == "total":
+            self.total = event.get("total")
+        elif kind == "overall_progress" and not self.quiet:
+            now = time.monotonic()
+            if now - self._last_progress < CLI_PROGRESS_INTERVAL and event.get("progress") != 100:
+                return
+            self._last_progress = now
+            total = f"/{self.total}" if self.total else ""
+            message = f"進捗: {event.get('progress', 0)}% ({event.get('done', 0)}{total} 本)"
+            if self.tty:
+                self.stream.write("\r" + message)
+                self.stream.flush()
+                self._progress_shown = True
+            else:
+                self._print(message)
+        elif kind == "confirm" and not self.quiet:
+            elapsed = event.get("elapsed_seconds")
+            self._print(f"出力: {event['output']}" + (f"（{elapsed} 秒）" if elapsed is not None else ""))
+
+    def close(self):
+        if self._progress_shown:
+            self.stream.write("\n")
+            self.stream.flush()
+            self._progress_shown = False
+
+def run_cli_job(url, api_key, output_dest, config, filters, languages, progress, resume_enabled=True):
+    # 1つの URL を処理し、完了したら True を返す
+    resume = None
+    if resume_enabled and config.get("auto_resume", True):
+        resume = find_resumable_manifest(output_dest, url=url, filters=filters, languages=languages)
+    events = process_and_stream(url, api_key, output_dest, config=config, resume=resume, filters=filters,
+                                languages=languages)
+    progress.total = None
+    progress.completed = False
+    try:
+        for line in events:
+            progress.event(line)
+    finally:
+        # Ctrl+C などで途中で抜けた場合は、process_and_stream がジョブを取り消して yt-dlp を止める
+        events.close()
+        progress.close()
+    return progress.completed
+
+def main(argv=None):
+    parser = build_cli_parser()
+    args = parser.parse_args(argv)
+    if not args.urls and not args.input:
+        run_server()
+        return 0
+    urls = list(args.urls)
+    try:
+        if args.input:
+            urls += read_url_list(args.input)
+        config = apply_config_overrides(load_config(), args)
+        filters = parse_video_filters({
+            "since": args.since, "until": args.until, "limit": args.limit,
+            "exclude_shorts": args.exclude_shorts, "exclude_live": args.exclude_live
+        })
+        languages = parse_language_options({"languages": args.languages, "language_mode": args.language_mode}, config)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not urls:
+        parser.error("URL が指定されていません。")
+    api_key = args.api_key or os.environ.get("YOUTUBE_API_KEY") or get_api_key()
+    if not api_key:
+        parser.error("API Key が設定されていません。--api-key か環境変数 YOUTUBE_API_KEY で指定してください。")
+
+    # --stdout で出力先の指定が無い場合は一時ディレクトリに書き、本文を標準出力に流してから消す
+    temp_dir = tempfile.mkdtemp(prefix="subtitles-") if args.stdout and not args.output else None
+    if len(urls) == 1 and not temp_dir:
+        default_dest = os.path.join(os.path.expanduser("~"), "Downloads", "subtitles.md")
+        destinations = [args.output or config.get("output_dest", default_dest)]
+    else:
+        out_dir = temp_dir or args.output or os.getcwd()
+        os.makedirs(out_dir, exist_ok=True)
+        destinations = [os.path.join(out_dir, cli_output_name(url)) for url in urls]
+
+    progress = CliProgress(ndjson=args.ndjson, verbose=args.verbose, quiet=args.quiet)
+    failed = 0
+    try:
+        for url, output_dest in zip(urls, destinations):
+            if len(urls) > 1 and not args.quiet:
+                progress.event(json.dumps({"type": "log", "message": f"処理開始: {url} -> {output_dest}"}))
+            if not run_cli_job(url, api_key, output_dest, config, filters, languages, progress,
+                               resume_enabled=not args.no_resume):
+                failed += 1
+                continue
+            if args.stdout:
+                with open(output_dest, "r", encoding="utf-8") as f:
+                    shutil.copyfileobj(f, sys.stdout)
+                sys.stdout.flush()
+            else:
+                print(output_dest, flush=True)
+    except KeyboardInterrupt:
+        sys.stderr.write("中断しました。同じコマンドを再実行すると続きから再開します。\n")
+        return 130
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())